@@ -1,20 +1,53 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, Response
 from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 import logging
 
+from app.config import settings
+from app.services.graph_service import graph_service
 from app.services.route_optimizer import route_optimizer
 from app.models.route import OptimizedRoute
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Graph data only changes on reload, so read-only responses can be reused by clients and CDNs
+CACHE_CONTROL = (f"public, max-age={settings.CACHE_TTL_SECONDS}, "
+                 f"stale-while-revalidate={settings.CACHE_TTL_SECONDS * 2}")
+
+
+def _cache_headers() -> Dict[str, str]:
+    return {"Cache-Control": CACHE_CONTROL, "ETag": graph_service.get_etag()}
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already covers the current graph"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _graph_unavailable() -> HTTPException:
+    """503 for a graph that isn't loaded yet, retrying the load if the last one failed"""
+    if graph_service.start_loading():
+        return HTTPException(
+            status_code=503, detail="Transport network data is still loading. Please retry shortly.")
+    return HTTPException(
+        status_code=503, detail="Transport network data is unavailable. Please retry later.",
+        headers={"Retry-After": str(settings.GRAPH_LOAD_RETRY_SECONDS)})
+
+
+class Coord(BaseModel):
+    lat: float = Field(..., ge=-90, le=90, description="Latitude")
+    lon: float = Field(..., ge=-180, le=180, description="Longitude")
+
 
 class RouteRequest(BaseModel):
-    start: Dict[str, float] = Field(...,
-                                    description="Start coordinates {lat, lon}")
-    end: Dict[str, float] = Field(...,
-                                  description="End coordinates {lat, lon}")
+    start: Coord = Field(..., description="Start coordinates {lat, lon}")
+    end: Coord = Field(..., description="End coordinates {lat, lon}")
     optimize_for: str = Field(
         default="time", description="time, cost, or transfers")
 
@@ -26,7 +59,9 @@ class StopRouteRequest(BaseModel):
         default="time", description="time, cost, or transfers")
 
 
-@router.post("/route", response_model=OptimizedRoute)
+# The route is built by our own code, so skip re-validating it against response_model;
+# OptimizedRoute is still advertised in the OpenAPI schema
+@router.post("/route", response_model=None, responses={200: {"model": OptimizedRoute}})
 async def find_route(request: RouteRequest):
     """
     Find optimal route between two coordinates
@@ -37,35 +72,16 @@ async def find_route(request: RouteRequest):
             raise HTTPException(
                 status_code=400, detail="optimize_for must be 'time', 'cost', or 'transfers'")
 
-        # Validate coordinates
-        start_lat = request.start.get("lat")
-        start_lon = request.start.get("lon")
-        end_lat = request.end.get("lat")
-        end_lon = request.end.get("lon")
-
-        if not all([start_lat, start_lon, end_lat, end_lon]):
-            raise HTTPException(
-                status_code=400, detail="Missing coordinates. Required: start.lat, start.lon, end.lat, end.lon")
-
-        # Validate coordinate ranges
-        if not (-90 <= start_lat <= 90) or not (-180 <= start_lon <= 180):
-            raise HTTPException(
-                status_code=400, detail="Invalid start coordinates. Latitude must be between -90 and 90, longitude between -180 and 180")
-
-        if not (-90 <= end_lat <= 90) or not (-180 <= end_lon <= 180):
-            raise HTTPException(
-                status_code=400, detail="Invalid end coordinates. Latitude must be between -90 and 90, longitude between -180 and 180")
-
-        # Find route
+        # Find route (coordinate presence and ranges are enforced by Coord)
         route = await route_optimizer.find_route(
-            start_lat, start_lon, end_lat, end_lon, request.optimize_for
+            request.start.lat, request.start.lon, request.end.lat, request.end.lon, request.optimize_for
         )
 
         if not route:
             raise HTTPException(
                 status_code=404, detail="No route found. Check if coordinates are within service area and walking distance limits.")
 
-        return route
+        return ORJSONResponse(route.model_dump(exclude_none=True))
 
     except HTTPException:
         raise
@@ -75,7 +91,7 @@ async def find_route(request: RouteRequest):
             status_code=500, detail="Internal server error occurred while finding route")
 
 
-@router.post("/route/stops", response_model=OptimizedRoute)
+@router.post("/route/stops", response_model=None, responses={200: {"model": OptimizedRoute}})
 async def find_route_by_stops(request: StopRouteRequest):
     """
     Find optimal route between two specific stops
@@ -85,12 +101,10 @@ async def find_route_by_stops(request: StopRouteRequest):
             raise HTTPException(
                 status_code=400, detail="optimize_for must be 'time', 'cost', or 'transfers'")
 
-        # Validate stop IDs exist
-        from app.services.graph_service import graph_service
-
-        if not graph_service.stops_cache:
-            await graph_service.load_graph_data()
+        if not await graph_service.wait_until_ready():
+            raise _graph_unavailable()
 
+        # Validate stop IDs exist
         if request.start_stop_id not in graph_service.stops_cache:
             raise HTTPException(
                 status_code=400, detail=f"Start stop '{request.start_stop_id}' not found")
@@ -99,7 +113,7 @@ async def find_route_by_stops(request: StopRouteRequest):
             raise HTTPException(
                 status_code=400, detail=f"End stop '{request.end_stop_id}' not found")
 
-        route = await route_optimizer.find_route_by_stops(
+        route = await route_optimizer.submit(
             request.start_stop_id, request.end_stop_id, request.optimize_for
         )
 
@@ -107,7 +121,7 @@ async def find_route_by_stops(request: StopRouteRequest):
             raise HTTPException(
                 status_code=404, detail="No route found between the specified stops")
 
-        return route
+        return ORJSONResponse(route.model_dump(exclude_none=True))
 
     except HTTPException:
         raise
@@ -119,6 +133,8 @@ async def find_route_by_stops(request: StopRouteRequest):
 
 @router.get("/stops/search")
 async def search_stops(
+    request: Request,
+    response: Response,
     q: str = Query(..., description="Search query"),
     limit: int = Query(default=10, le=50, description="Maximum results")
 ):
@@ -126,6 +142,13 @@ async def search_stops(
     Search for stops by name
     """
     try:
+        # Results from the database fallback aren't tied to a graph generation
+        if graph_service.is_ready():
+            headers = _cache_headers()
+            if _etag_matches(request, headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            response.headers.update(headers)
+
         suggestions = await route_optimizer.get_stop_suggestions(q, limit)
         return {"suggestions": suggestions}
 
@@ -147,10 +170,7 @@ async def get_nearby_stops(
     Get nearby stops to given coordinates
     """
     try:
-        from app.services.graph_service import graph_service
-
-        if not graph_service.stops_cache:
-            await graph_service.load_graph_data()
+        await graph_service.wait_until_ready()
 
         # Validate coordinates are within service area
         if not graph_service.validate_coordinates(lat, lon):
@@ -166,15 +186,15 @@ async def get_nearby_stops(
         for stop_id, distance in nearby_stops_with_dist:
             if stop_id in graph_service.stops_cache:
                 stop = graph_service.stops_cache[stop_id]
-                walking_time, _ = graph_service.calculate_walking_time_from_coords(
-                    lat, lon, stop_id)
+                # Reuse the distance from the nearest-stop search instead of recomputing it
+                walking_time = int(distance / settings.WALKING_SPEED_KMH * 60)
                 stops.append({
                     "stop_id": stop.stop_id,
                     "name": stop.name,
                     "latitude": stop.location.coordinates[1],
                     "longitude": stop.location.coordinates[0],
                     "distance_km": round(distance, 3),
-                    "walking_time_minutes": walking_time if walking_time != float('inf') else None
+                    "walking_time_minutes": walking_time
                 })
 
         return {"nearby_stops": stops}
@@ -188,28 +208,23 @@ async def get_nearby_stops(
 
 
 @router.get("/graph/nodes")
-async def get_graph_nodes():
+async def get_graph_nodes(request: Request):
     """
     Get all stops (nodes) in the transport network for graph visualization
     """
     try:
-        from app.services.graph_service import graph_service
-        
-        if not graph_service.stops_cache:
-            await graph_service.load_graph_data()
-        
-        nodes = []
-        for stop_id, stop in graph_service.stops_cache.items():
-            nodes.append({
-                "id": stop.stop_id,
-                "name": stop.name,
-                "latitude": stop.location.coordinates[1],
-                "longitude": stop.location.coordinates[0],
-                "connections_count": len(stop.connections)
-            })
+        if not graph_service.is_ready():
+            raise _graph_unavailable()
         
-        return {"nodes": nodes}
+        headers = _cache_headers()
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        # Payload is serialized once per graph load
+        return Response(graph_service.get_nodes_payload(), media_type="application/json", headers=headers)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting graph nodes: {str(e)}")
         raise HTTPException(
@@ -217,37 +232,23 @@ async def get_graph_nodes():
 
 
 @router.get("/graph/edges")
-async def get_graph_edges():
+async def get_graph_edges(request: Request):
     """
     Get all connections (edges) in the transport network for graph visualization
     """
     try:
-        from app.services.graph_service import graph_service
-        
-        if not graph_service.stops_cache:
-            await graph_service.load_graph_data()
-        
-        edges = []
-        for stop_id, stop in graph_service.stops_cache.items():
-            for connection in stop.connections:
-                edge = {
-                    "from": stop_id,
-                    "to": connection.to_stop_id,
-                    "route_id": connection.route_id,
-                    "time": connection.time,
-                    "cost": connection.cost,
-                    "sequence": connection.sequence
-                }
-                
-                # Get route info for edge styling
-                route_info = graph_service.routes_cache.get(connection.route_id, {})
-                edge["route_type"] = route_info.get("route_type", "bus")
-                edge["route_name"] = route_info.get("route_long_name", f"Route {connection.route_id}")
-                
-                edges.append(edge)
+        if not graph_service.is_ready():
+            raise _graph_unavailable()
         
-        return {"edges": edges}
+        headers = _cache_headers()
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        # Payload is serialized once per graph load
+        return Response(graph_service.get_edges_payload(), media_type="application/json", headers=headers)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting graph edges: {str(e)}")
         raise HTTPException(
@@ -260,14 +261,12 @@ async def get_algorithm_steps(request: StopRouteRequest):
     Get step-by-step execution of pathfinding algorithm for visualization
     """
     try:
-        from app.services.graph_service import graph_service
-        
         if request.optimize_for not in ["time", "cost", "transfers"]:
             raise HTTPException(
                 status_code=400, detail="optimize_for must be 'time', 'cost', or 'transfers'")
         
-        if not graph_service.stops_cache:
-            await graph_service.load_graph_data()
+        if not await graph_service.wait_until_ready():
+            raise _graph_unavailable()
         
         if request.start_stop_id not in graph_service.stops_cache:
             raise HTTPException(
@@ -293,40 +292,23 @@ async def get_algorithm_steps(request: StopRouteRequest):
 
 
 @router.get("/graph/stats")
-async def get_graph_stats():
+async def get_graph_stats(request: Request, response: Response):
     """
     Get network statistics for analysis display
     """
     try:
-        from app.services.graph_service import graph_service
-        
-        if not graph_service.stops_cache:
-            await graph_service.load_graph_data()
-        
-        total_nodes = len(graph_service.stops_cache)
-        total_edges = sum(len(stop.connections) for stop in graph_service.stops_cache.values())
-        
-        # Calculate route type distribution
-        route_types = {}
-        for route_id, route_info in graph_service.routes_cache.items():
-            route_type = route_info.get("route_type", "bus")
-            route_types[route_type] = route_types.get(route_type, 0) + 1
+        if not graph_service.is_ready():
+            raise _graph_unavailable()
         
-        # Calculate connectivity stats
-        max_connections = max(len(stop.connections) for stop in graph_service.stops_cache.values()) if graph_service.stops_cache else 0
-        avg_connections = total_edges / total_nodes if total_nodes > 0 else 0
-        
-        return {
-            "network_stats": {
-                "total_nodes": total_nodes,
-                "total_edges": total_edges,
-                "total_routes": len(graph_service.routes_cache),
-                "max_connections_per_stop": max_connections,
-                "avg_connections_per_stop": round(avg_connections, 2),
-                "route_type_distribution": route_types
-            }
-        }
+        headers = _cache_headers()
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        return graph_service.get_stats_payload()
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting graph stats: {str(e)}")
         raise HTTPException(
@@ -334,7 +316,7 @@ async def get_graph_stats():
 
 
 @router.get("/health")
-async def health_check():
+def health_check():
     """
     Health check endpoint
     """
@@ -6,6 +6,7 @@ class Settings:
     # Database
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "smartroute")
+    INCREMENTAL_LOAD: bool = os.getenv("INCREMENTAL_LOAD") == "1"  # GTFS loader upserts instead of clearing collections
 
     # API
     API_V1_PREFIX: str = "/api/v1"
@@ -18,6 +19,8 @@ class Settings:
     WALKING_SPEED_KMH: float = 5.0  # km/h for connecting nearby stops
     MAX_WALKING_DISTANCE_KM: float = 0.5  # max walking distance to connect stops
     MAX_SEARCH_RADIUS_KM: float = 50.0  # max distance from any stop to accept coordinates
+    BIDIRECTIONAL_SEARCH_MIN_KM: float = 8.0  # stop pairs at least this far apart search from both ends
+    ROUTE_CANDIDATE_STOPS: int = 8  # stops within walking distance seeded into one route search
     
     # Transit mode specific parameters
     BUS_BOARDING_TIME: int = 2  # minutes to board bus
@@ -27,6 +30,9 @@ class Settings:
 
     # Cache
     CACHE_TTL_SECONDS: int = 300  # 5 minutes
+    ROUTE_CACHE_SIZE: int = 4096  # coordinate routes kept by RouteOptimizer
+    SSSP_CACHE_SIZE: int = 32  # shortest-path trees kept per origin stop
+    GRAPH_LOAD_RETRY_SECONDS: int = 30  # wait before retrying a graph load that found no data
 
     class Config:
         case_sensitive = True
@@ -1,5 +1,7 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import logging
 import uvicorn
 
@@ -7,6 +9,7 @@ from app.config import settings
 from app.database import connect_to_mongo, close_mongo_connection, database
 from app.api.routes import router
 from app.services.graph_service import graph_service
+from app.services import _dijkstra, _geo
 
 # Configure logging
 logging.basicConfig(
@@ -19,7 +22,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    description="Public Transport Route Optimizer API"
+    description="Public Transport Route Optimizer API",
+    # orjson serializes large graph/route payloads much faster than stdlib json
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -38,6 +43,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses (graph nodes/edges run to several MB); level 6 trades a
+# slightly larger body for much less CPU than the default of 9
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+
 # Include API routes
 app.include_router(router, prefix=settings.API_V1_PREFIX)
 
@@ -65,8 +74,13 @@ async def load_graph_data_background():
         # Ensure database is connected before loading graph data
         if database.database is None:
             await connect_to_mongo()
-        await graph_service.load_graph_data()
-        logger.info("Graph data loaded successfully")
+        if await graph_service.wait_until_ready():
+            logger.info("Graph data loaded successfully")
+        else:
+            logger.warning("Graph data not available yet; it will be loaded on the next request")
+        # Compile the distance and pathfinding kernels now rather than on the first request
+        _geo.warmup()
+        _dijkstra.warmup()
     except Exception as e:
         logger.error(f"Failed to load graph data: {e}")
 
@@ -93,6 +107,8 @@ if __name__ == "__main__":
         "app.main:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
         reload=True,
         log_level="info"
     )
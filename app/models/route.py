@@ -1,6 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field
-from bson import ObjectId
+from pydantic import BaseModel, ConfigDict, Field
 from app.models.stop import PyObjectId
 
 
@@ -12,10 +11,7 @@ class Route(BaseModel):
     route_type: str = Field(
         default="bus", description="bus, metro, train, etc.")
 
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
 
 
 class RouteCreate(BaseModel):
@@ -1,17 +1,26 @@
 from typing import List, Optional, Dict, Any, Annotated
-from pydantic import BaseModel, Field, BeforeValidator
+from pydantic import BaseModel, ConfigDict, Field, BeforeValidator, PlainSerializer
 from bson import ObjectId
 
 
 def validate_object_id(v):
     if isinstance(v, ObjectId):
         return v
-    if ObjectId.is_valid(v):
+    if v is None:
+        # ObjectId(None) would silently generate a fresh id
+        raise ValueError("Invalid ObjectId")
+    # Parse once; ObjectId.is_valid() followed by ObjectId() would parse twice
+    try:
         return ObjectId(v)
-    raise ValueError("Invalid ObjectId")
+    except Exception:
+        raise ValueError("Invalid ObjectId")
 
 
-PyObjectId = Annotated[ObjectId, BeforeValidator(validate_object_id)]
+PyObjectId = Annotated[
+    ObjectId,
+    BeforeValidator(validate_object_id),
+    PlainSerializer(str, return_type=str, when_used="json")
+]
 
 
 class Location(BaseModel):
@@ -34,10 +43,7 @@ class Stop(BaseModel):
     location: Location
     connections: List[Connection] = []
 
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
 
 
 class StopCreate(BaseModel):
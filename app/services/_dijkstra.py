@@ -0,0 +1,188 @@
+"""
+Compiled Dijkstra kernel over the CSR adjacency built by the graph service.
+Only available when Numba is installed; callers fall back to the pure-Python search otherwise.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Optional: the graph service keeps its heapq implementation
+    njit = None
+
+# Optimization criteria, matching GraphService._dijkstra_pathfinding priorities
+MODE_TIME = 0
+MODE_COST = 1
+MODE_TRANSFERS = 2
+
+OPTIMIZE_MODES = {"time": MODE_TIME, "cost": MODE_COST, "transfers": MODE_TRANSFERS}
+
+HEAP_ARITY = 4
+
+
+if njit is not None:
+    # Indexed 4-ary heap over stop ids with the same sift rules as _heap.IndexedDHeap
+    @njit(cache=True)
+    def _sift_up(heap, pos, key, i):
+        node = heap[i]
+        k = key[node]
+        while i > 0:
+            parent = (i - 1) // HEAP_ARITY
+            parent_node = heap[parent]
+            if k >= key[parent_node]:
+                break
+            heap[i] = parent_node
+            pos[parent_node] = i
+            i = parent
+        heap[i] = node
+        pos[node] = i
+
+    @njit(cache=True)
+    def _sift_down(heap, pos, key, size, i):
+        node = heap[i]
+        k = key[node]
+        while True:
+            first = HEAP_ARITY * i + 1
+            if first >= size:
+                break
+            child = first
+            child_key = key[heap[first]]
+            for c in range(first + 1, min(first + HEAP_ARITY, size)):
+                if key[heap[c]] < child_key:
+                    child = c
+                    child_key = key[heap[c]]
+            if child_key >= k:
+                break
+            heap[i] = heap[child]
+            pos[heap[i]] = i
+            i = child
+        heap[i] = node
+        pos[node] = i
+
+    @njit(cache=True)
+    def _push_or_decrease(heap, pos, key, size, node, priority):
+        i = pos[node]
+        if i < 0:
+            i = size
+            heap[i] = node
+            size += 1
+        elif priority >= key[node]:
+            return size
+        key[node] = priority
+        _sift_up(heap, pos, key, i)
+        return size
+
+    @njit(cache=True)
+    def _pop_min(heap, pos, key, size):
+        top = heap[0]
+        size -= 1
+        pos[top] = -1
+        if size > 0:
+            heap[0] = heap[size]
+            _sift_down(heap, pos, key, size, 0)
+        return top, key[top], size
+
+    @njit(cache=True)
+    def dijkstra_csr(indptr, indices, times, costs, routes, boarding, transfer_time,
+                     sources, source_offsets, target_offsets, mode, max_transfers):
+        """
+        Multi-source, multi-target search with the same priorities, transfer penalties,
+        pruning and heap (hence tie-breaking) as the Python implementation. target_offsets is inf
+        for stops that aren't targets.
+        Returns (best_target or -1, prev_stop, prev_edge, g_time, g_cost, g_transfers) indexed by stop.
+        """
+        n = indptr.shape[0] - 1
+        # Decrease-key keeps at most one queue entry per stop
+        heap = np.empty(n, np.int64)
+        pos = np.full(n, -1, np.int64)
+        key = np.zeros(n, np.float64)
+
+        best = np.full(n, np.inf)
+        prev_stop = np.full(n, -1, np.int64)
+        prev_edge = np.full(n, -1, np.int64)
+        g_time = np.zeros(n, np.int64)
+        g_cost = np.zeros(n, np.float64)
+        g_transfers = np.zeros(n, np.int64)
+        g_route = np.full(n, -1, np.int64)
+        g_offset = np.zeros(n, np.float64)
+
+        size = 0
+        for i in range(sources.shape[0]):
+            source = sources[i]
+            best[source] = source_offsets[i]
+            g_offset[source] = source_offsets[i]
+            size = _push_or_decrease(heap, pos, key, size, source, source_offsets[i])
+
+        best_target = -1
+        best_total = np.inf
+        # Best total seen at any target so far, popped or not; labels at or above it aren't queued
+        upper = np.inf
+        while size > 0:
+            current_stop, current_cost, size = _pop_min(heap, pos, key, size)
+            if current_cost >= best_total:
+                break
+
+            total = current_cost + target_offsets[current_stop]
+            if total < best_total:
+                best_target = current_stop
+                best_total = total
+
+            transfers = g_transfers[current_stop]
+            if transfers >= max_transfers:
+                continue
+
+            last_route = g_route[current_stop]
+            offset = g_offset[current_stop]
+            for edge in range(indptr[current_stop], indptr[current_stop + 1]):
+                next_stop = indices[edge]
+                route = routes[edge]
+
+                is_transfer = 0
+                if last_route < 0:
+                    boarding_penalty = boarding[route]
+                elif last_route != route:
+                    boarding_penalty = boarding[route] + transfer_time
+                    is_transfer = 1
+                else:
+                    boarding_penalty = 0
+
+                new_time = g_time[current_stop] + times[edge] + boarding_penalty
+                new_cost = g_cost[current_stop] + costs[edge]
+                new_transfers = transfers + is_transfer
+
+                if mode == MODE_TIME:
+                    priority = float(new_time)
+                elif mode == MODE_COST:
+                    priority = new_cost
+                else:
+                    priority = float(new_transfers * 100 + new_time)
+                priority += offset
+                if priority >= upper:
+                    continue
+
+                if priority < best[next_stop]:
+                    upper = min(upper, priority + target_offsets[next_stop])
+                    best[next_stop] = priority
+                    prev_stop[next_stop] = current_stop
+                    prev_edge[next_stop] = edge
+                    g_time[next_stop] = new_time
+                    g_cost[next_stop] = new_cost
+                    g_transfers[next_stop] = new_transfers
+                    g_route[next_stop] = route
+                    g_offset[next_stop] = offset
+                    size = _push_or_decrease(heap, pos, key, size, next_stop, priority)
+
+        return best_target, prev_stop, prev_edge, g_time, g_cost, g_transfers
+else:
+    dijkstra_csr = None
+
+
+def warmup():
+    """Trigger JIT compilation so the first route request doesn't pay for it"""
+    if dijkstra_csr is None:
+        return
+    dijkstra_csr(
+        np.array([0, 1, 1], dtype=np.int32), np.array([1], dtype=np.int32),
+        np.array([1], dtype=np.int32), np.array([1.0]), np.array([0], dtype=np.int32),
+        np.array([1], dtype=np.int32), 0, np.array([0], dtype=np.int64), np.array([0.0]),
+        np.array([np.inf, 0.0]), MODE_TIME, 5
+    )
@@ -0,0 +1,82 @@
+"""
+Indexed d-ary min-heap used by the pure-Python Dijkstra search.
+Holds at most one entry per node, so a better path lowers the node's key in place
+instead of pushing a duplicate. The compiled kernel in _dijkstra mirrors the same
+sift rules, so both searches break ties identically.
+"""
+from typing import List, Tuple
+
+
+class IndexedDHeap:
+    """Min-heap over node ids 0..n-1 with decrease-key"""
+
+    __slots__ = ("d", "heap", "pos", "key")
+
+    def __init__(self, n: int, d: int = 4):
+        self.d = d
+        self.heap: List[int] = []
+        # Position of each node in heap, -1 when it isn't queued
+        self.pos: List[int] = [-1] * n
+        self.key: List[float] = [0.0] * n
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push_or_decrease(self, node: int, priority: float):
+        """Queue node with priority, or lower its priority if it's already queued"""
+        i = self.pos[node]
+        if i < 0:
+            i = len(self.heap)
+            self.heap.append(node)
+        elif priority >= self.key[node]:
+            return
+        self.key[node] = priority
+        self._sift_up(i)
+
+    def pop_min(self) -> Tuple[int, float]:
+        """Remove and return (node, priority) with the smallest priority"""
+        heap, pos = self.heap, self.pos
+        top = heap[0]
+        last = heap.pop()
+        pos[top] = -1
+        if heap:
+            heap[0] = last
+            self._sift_down(0)
+        return top, self.key[top]
+
+    def _sift_up(self, i: int):
+        heap, pos, key, d = self.heap, self.pos, self.key, self.d
+        node = heap[i]
+        k = key[node]
+        while i > 0:
+            parent = (i - 1) // d
+            parent_node = heap[parent]
+            if k >= key[parent_node]:
+                break
+            heap[i] = parent_node
+            pos[parent_node] = i
+            i = parent
+        heap[i] = node
+        pos[node] = i
+
+    def _sift_down(self, i: int):
+        heap, pos, key, d = self.heap, self.pos, self.key, self.d
+        size = len(heap)
+        node = heap[i]
+        k = key[node]
+        while True:
+            first = d * i + 1
+            if first >= size:
+                break
+            child, child_key = first, key[heap[first]]
+            for c in range(first + 1, min(first + d, size)):
+                c_key = key[heap[c]]
+                if c_key < child_key:
+                    child, child_key = c, c_key
+            if child_key >= k:
+                break
+            heap[i] = heap[child]
+            pos[heap[i]] = i
+            i = child
+        heap[i] = node
+        pos[node] = i
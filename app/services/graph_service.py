@@ -1,56 +1,424 @@
+import asyncio
+import hashlib
+from itertools import islice
 import heapq
 import math
-import itertools
 from typing import Dict, List, Tuple, Optional, Set
-from geopy.distance import geodesic
 import logging
+import sys
+import time
+import numpy as np
+import orjson
+from cachetools import LRUCache, TTLCache
 from app.database import get_database
 from app.models.stop import Stop, Connection
 from app.models.route import RouteSegment, OptimizedRoute
 from app.config import settings
+from app.services._geo import KM_PER_DEG_LAT, KM_PER_DEG_LON, cheap_distance_km, haversine_into
+from app.services._heap import IndexedDHeap
+from app.services._dijkstra import OPTIMIZE_MODES, MODE_TRANSFERS, dijkstra_csr
 from datetime import datetime, timedelta
 
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Optional: nearest-stop search falls back to a vectorized scan
+    cKDTree = None
+
 logger = logging.getLogger(__name__)
 
+# Per-stop travel estimates for routes found by their stop lists
+_ROUTE_STOP_MINUTES = 3
+_ROUTE_STOP_COST = 2.0
+
+# Stops per end tried by the per-pair fallback in find_optimal_route
+_FALLBACK_PAIR_STOPS = 3
+
+# Cap on recorded steps for the algorithm visualization
+_MAX_VISUALIZATION_STEPS = 100
+
+# Penalties for routes that aren't in routes_cache or aren't metro
+_DEFAULT_PENALTIES: Tuple[int, int] = (settings.BUS_BOARDING_TIME, settings.TRANSFER_WALKING_TIME)
+
 
 class GraphService:
     def __init__(self):
         self.stops_cache: Dict[str, Stop] = {}
         self.routes_cache: Dict[str, dict] = {}
+        # Bumped on every reload so derived caches can tell they are stale
+        self._generation: int = 0
+        # Pre-serialized visualization payloads, rebuilt only on reload
+        self._nodes_payload: Optional[bytes] = None
+        self._edges_payload: Optional[bytes] = None
+        self._stats_payload: Optional[Dict] = None
+        self._edges_list: Optional[List[Dict]] = None
+        # Lower-cased stop names for in-memory autocomplete
+        self._name_index: Optional[List[Tuple[str, Stop]]] = None
+        # route_id -> (boarding time, transfer time)
+        self._route_penalties: Optional[Dict[str, Tuple[int, int]]] = None
+        # stop_id -> routes serving it, and route_id -> {stop_id: position along the route}
+        self._stop_to_routes: Optional[Dict[str, Set[str]]] = None
+        self._route_stops_pos: Optional[Dict[str, Dict[str, int]]] = None
+        # route_id -> cumulative travel time / cost from the route's first stop, by position
+        self._route_cumtime: Optional[Dict[str, np.ndarray]] = None
+        self._route_cumcost: Optional[Dict[str, np.ndarray]] = None
+        # HTTP validator for the read-only graph endpoints
+        self._etag: Optional[str] = None
+        # Structure-of-arrays view of stop coordinates (degrees, plus radians for vectorized distances)
+        self._stop_ids: np.ndarray = np.empty(0, dtype=object)
+        self._idx_of: Dict[str, int] = {}
+        self._lat_deg: np.ndarray = np.empty(0, dtype=np.float64)
+        self._lon_deg: np.ndarray = np.empty(0, dtype=np.float64)
+        self._lats: np.ndarray = np.empty(0, dtype=np.float64)
+        self._lons: np.ndarray = np.empty(0, dtype=np.float64)
+        self._spatial_generation: int = -1
+        # k-d tree over stops projected to a local flat plane in km; kx is km per degree of longitude
+        self._stop_tree = None
+        self._kx: float = KM_PER_DEG_LON
+        # validate_coordinates results keyed by coordinates rounded to ~100m
+        self._valid_coords_cache: LRUCache = LRUCache(maxsize=4096)
+        # CSR adjacency: edges of stop i are indptr[i]:indptr[i+1] in the per-edge arrays
+        self._stop_index: Dict[str, int] = {}
+        self._stop_order: List[str] = []
+        self._indptr: np.ndarray = np.zeros(1, dtype=np.int32)
+        self._indices: np.ndarray = np.empty(0, dtype=np.int32)
+        self._times: np.ndarray = np.empty(0, dtype=np.int32)
+        self._costs: np.ndarray = np.empty(0, dtype=np.float64)
+        self._route_idx: np.ndarray = np.empty(0, dtype=np.int32)
+        self._sequences: np.ndarray = np.empty(0, dtype=np.int32)
+        self._route_ids: List[str] = []
+        self._route_boarding: List[int] = []
+        self._route_boarding_arr: np.ndarray = np.empty(0, dtype=np.int32)
+        # Display fields for path reconstruction, indexed like the stop and route indices
+        self._stop_names: List[str] = []
+        self._route_names: List[str] = []
+        self._route_types: List[str] = []
+        # Reverse CSR for backward searches: incoming edge ids of stop i are
+        # redges[rindptr[i]:rindptr[i+1]]; edge_source maps an edge id to its origin stop
+        self._rindptr: np.ndarray = np.zeros(1, dtype=np.int32)
+        self._redges: np.ndarray = np.empty(0, dtype=np.int32)
+        self._edge_source: np.ndarray = np.empty(0, dtype=np.int32)
+        self._adjacency_generation: int = -1
+        # Full shortest-path trees, keyed by (generation, start index, optimize_for,
+        # max_transfers); shared by every destination asked for from the same origin
+        self._sssp_cache: TTLCache = TTLCache(maxsize=settings.SSSP_CACHE_SIZE, ttl=settings.CACHE_TTL_SECONDS)
+        # Origins searched from once, under the same keys; a tree is only built when one comes back
+        self._sssp_origins: TTLCache = TTLCache(maxsize=settings.SSSP_CACHE_SIZE * 16,
+                                                ttl=settings.CACHE_TTL_SECONDS)
+        # Readiness gate: set once a load has populated the caches
+        self._ready = asyncio.Event()
+        self._load_task: Optional[asyncio.Task] = None
+        # Monotonic time of the last load that left the caches empty
+        self._load_failed_at: Optional[float] = None
+
+    def is_ready(self) -> bool:
+        """Whether graph data has been loaded"""
+        return self._ready.is_set()
+
+    @property
+    def generation(self) -> int:
+        """Bumped whenever the graph data changes; key caches on it to drop stale entries"""
+        return self._generation
+
+    async def wait_until_ready(self) -> bool:
+        """
+        Ensure graph data is loaded, sharing one in-flight load between concurrent callers.
+        Returns False if the load did not produce any data; after such a load, callers
+        get False without touching the database until GRAPH_LOAD_RETRY_SECONDS pass.
+        """
+        if self._ready.is_set():
+            return True
+
+        if not self.start_loading():
+            return False
+        await asyncio.shield(self._load_task)
+        return self._ready.is_set()
+
+    def start_loading(self) -> bool:
+        """
+        Start a background load unless one is running or a failed load is too recent
+        to retry. Returns whether a load is now in progress.
+        """
+        loop = asyncio.get_running_loop()
+        if self._load_task is None or self._load_task.done() or self._load_task.get_loop() is not loop:
+            if (self._load_failed_at is not None
+                    and time.monotonic() - self._load_failed_at < settings.GRAPH_LOAD_RETRY_SECONDS):
+                return False
+            self._load_task = loop.create_task(self._load_and_record())
+        return True
+
+    async def _load_and_record(self):
+        """Load graph data and note when a load leaves the caches empty"""
+        try:
+            await self.load_graph_data()
+        finally:
+            self._load_failed_at = None if self._ready.is_set() else time.monotonic()
+
+    def _invalidate_derived_caches(self):
+        """Drop everything computed from stops_cache/routes_cache"""
+        self._generation += 1
+        self._nodes_payload = None
+        self._edges_payload = None
+        self._stats_payload = None
+        self._edges_list = None
+        self._name_index = None
+        self._etag = None
+        self._route_penalties = None
+        self._stop_to_routes = None
+        self._route_stops_pos = None
+        self._route_cumtime = None
+        self._route_cumcost = None
+
+    def _build_edge_list(self):
+        """Flatten every connection into its final edge dict, route metadata merged in"""
+        # Resolve route styling once per route rather than once per connection
+        route_meta = {}
+        edges = []
+        for stop_id, stop in self.stops_cache.items():
+            for connection in stop.connections:
+                route_id = connection.route_id
+                meta = route_meta.get(route_id)
+                if meta is None:
+                    route_info = self.routes_cache.get(route_id, {})
+                    meta = route_meta[route_id] = (
+                        route_info.get("route_type", "bus"),
+                        route_info.get("route_long_name", f"Route {route_id}")
+                    )
+                edges.append({
+                    "from": stop_id,
+                    "to": connection.to_stop_id,
+                    "route_id": route_id,
+                    "time": connection.time,
+                    "cost": connection.cost,
+                    "sequence": connection.sequence,
+                    "route_type": meta[0],
+                    "route_name": meta[1]
+                })
+
+        self._edges_list = edges
+
+    def _build_graph_payloads(self):
+        """Serialize /graph/nodes and /graph/edges once per graph load"""
+        nodes = [
+            {
+                "id": stop.stop_id,
+                "name": stop.name,
+                "latitude": stop.location.coordinates[1],
+                "longitude": stop.location.coordinates[0],
+                "connections_count": len(stop.connections)
+            }
+            for stop in self.stops_cache.values()
+        ]
+
+        if self._edges_list is None:
+            self._build_edge_list()
+
+        self._nodes_payload = orjson.dumps({"nodes": nodes})
+        self._edges_payload = orjson.dumps({"edges": self._edges_list})
+
+    def get_nodes_payload(self) -> bytes:
+        """Serialized graph nodes, built lazily if the cache was filled directly"""
+        if self._nodes_payload is None:
+            self._build_graph_payloads()
+        return self._nodes_payload
+
+    def get_edges_payload(self) -> bytes:
+        """Serialized graph edges, built lazily if the cache was filled directly"""
+        if self._edges_payload is None:
+            self._build_graph_payloads()
+        return self._edges_payload
+
+    def get_etag(self) -> str:
+        """Validator for responses derived from the loaded graph, hashed once per generation"""
+        if self._etag is None:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(self.get_nodes_payload())
+            digest.update(self.get_edges_payload())
+            self._etag = f'W/"{digest.hexdigest()}"'
+        return self._etag
+
+    def _build_graph_stats(self):
+        """Compute network statistics once per graph load"""
+        total_nodes = len(self.stops_cache)
+        total_edges = 0
+        max_connections = 0
+        for stop in self.stops_cache.values():
+            connections_count = len(stop.connections)
+            total_edges += connections_count
+            max_connections = max(max_connections, connections_count)
+
+        # Calculate route type distribution
+        route_types = {}
+        for route_info in self.routes_cache.values():
+            route_type = route_info.get("route_type", "bus")
+            route_types[route_type] = route_types.get(route_type, 0) + 1
+
+        avg_connections = total_edges / total_nodes if total_nodes > 0 else 0
+
+        self._stats_payload = {
+            "network_stats": {
+                "total_nodes": total_nodes,
+                "total_edges": total_edges,
+                "total_routes": len(self.routes_cache),
+                "max_connections_per_stop": max_connections,
+                "avg_connections_per_stop": round(avg_connections, 2),
+                "route_type_distribution": route_types
+            }
+        }
+
+    def get_stats_payload(self) -> Dict:
+        """Network statistics, computed lazily if the cache was filled directly"""
+        if self._stats_payload is None:
+            self._build_graph_stats()
+        return self._stats_payload
+
+    def _build_spatial_index(self):
+        """Flatten stop coordinates into contiguous arrays"""
+        self._stop_ids = np.array(list(self.stops_cache.keys()), dtype=object)
+        # MongoDB stores [longitude, latitude]
+        coords = np.array(
+            [stop.location.coordinates[:2] for stop in self.stops_cache.values()],
+            dtype=np.float64
+        ).reshape(-1, 2)
+        self._idx_of = {stop_id: i for i, stop_id in enumerate(self.stops_cache)}
+        self._lon_deg = np.ascontiguousarray(coords[:, 0])
+        self._lat_deg = np.ascontiguousarray(coords[:, 1])
+        self._lons = np.radians(self._lon_deg)
+        self._lats = np.radians(self._lat_deg)
+        # k-d tree answers k-NN in O(log N) instead of scanning every stop; the flat projection
+        # is only used to pick candidates, which are then ranked by haversine distance
+        self._stop_tree = None
+        if cKDTree is not None and len(self._stop_ids) > 0:
+            self._kx = KM_PER_DEG_LON * math.cos(math.radians(float(self._lat_deg.mean())))
+            self._stop_tree = cKDTree(np.column_stack([self._lat_deg * KM_PER_DEG_LAT, self._lon_deg * self._kx]))
+        self._valid_coords_cache.clear()
+        self._spatial_generation = self._generation
+
+    def _ensure_spatial_index(self):
+        """Rebuild the coordinate arrays if the stops cache changed underneath them"""
+        if self._spatial_generation != self._generation or len(self._stop_ids) != len(self.stops_cache):
+            self._build_spatial_index()
+
+    def _build_adjacency(self):
+        """Flatten stop connections into CSR arrays for the pathfinding hot loop"""
+        self._stop_order = list(self.stops_cache.keys())
+        self._stop_index = {stop_id: i for i, stop_id in enumerate(self._stop_order)}
+
+        route_index: Dict[str, int] = {}
+        indptr = np.zeros(len(self._stop_order) + 1, dtype=np.int32)
+        indices, times, costs, routes, sequences = [], [], [], [], []
+        for i, stop in enumerate(self.stops_cache.values()):
+            for connection in stop.connections:
+                target = self._stop_index.get(connection.to_stop_id)
+                if target is None:  # Connection to a stop that isn't loaded
+                    continue
+                route = route_index.setdefault(connection.route_id, len(route_index))
+                indices.append(target)
+                times.append(connection.time)
+                costs.append(connection.cost)
+                routes.append(route)
+                sequences.append(connection.sequence)
+            indptr[i + 1] = len(indices)
+
+        self._indptr = indptr
+        self._indices = np.array(indices, dtype=np.int32)
+        self._times = np.array(times, dtype=np.int32)
+        self._costs = np.array(costs, dtype=np.float64)
+        self._route_idx = np.array(routes, dtype=np.int32)
+        self._sequences = np.array(sequences, dtype=np.int32)
+        self._route_ids = list(route_index)
+        self._route_boarding = [self.get_mode_specific_penalties(route_id)[0] for route_id in self._route_ids]
+        self._route_boarding_arr = np.array(self._route_boarding, dtype=np.int32)
+
+        self._stop_names = [stop.name for stop in self.stops_cache.values()]
+        route_docs = [self.routes_cache.get(route_id, {}) for route_id in self._route_ids]
+        self._route_names = [doc.get("route_long_name", f"Route {route_id}")
+                             for route_id, doc in zip(self._route_ids, route_docs)]
+        self._route_types = [doc.get("route_type", "bus") for doc in route_docs]
+
+        n = len(self._stop_order)
+        self._edge_source = np.repeat(np.arange(n, dtype=np.int32), np.diff(indptr))
+        self._redges = np.argsort(self._indices, kind="stable").astype(np.int32)
+        self._rindptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self._indices, minlength=n), out=self._rindptr[1:])
+        self._sssp_cache.clear()
+        self._sssp_origins.clear()
+        self._adjacency_generation = self._generation
+
+    def _ensure_adjacency(self):
+        """Rebuild the CSR arrays if the stops cache changed underneath them"""
+        if self._adjacency_generation != self._generation or len(self._indptr) != len(self.stops_cache) + 1:
+            self._build_adjacency()
+
+    def _distances_from(self, latitude: float, longitude: float) -> np.ndarray:
+        """Haversine distance in km from a point to every stop"""
+        distances = np.empty_like(self._lats)
+        haversine_into(math.radians(latitude), math.radians(longitude), self._lats, self._lons, distances)
+        return distances
 
     async def load_graph_data(self):
-        """Load and cache graph data from database"""
+        """
+        Load and cache graph data from database. A loaded graph keeps serving while
+        the reload fetches; the new data is then swapped in without yielding.
+        """
         try:
             db = await get_database()
             if db is None:
                 logger.error("Database not available for loading graph data")
                 return
 
-            # Load stops
-            self.stops_cache.clear()
-            async for stop_doc in db.stops.find():
-                stop = Stop(**stop_doc)
-                self.stops_cache[stop.stop_id] = stop
-
-            # Load routes
-            self.routes_cache.clear()
-            async for route_doc in db.routes.find():
-                self.routes_cache[route_doc["route_id"]] = route_doc
+            # Drain both collections concurrently, each cursor in one go
+            stop_docs, route_docs = await asyncio.gather(
+                db.stops.find().to_list(length=None),
+                db.routes.find().to_list(length=None)
+            )
 
-            logger.info(
-                f"Graph data loaded: {len(self.stops_cache)} stops, {len(self.routes_cache)} routes")
+            # Parse before touching the live caches, so a bad document leaves them intact
+            stops_cache = {stop.stop_id: stop for stop in (Stop(**doc) for doc in stop_docs)}
+            routes_cache = {route_doc["route_id"]: route_doc for route_doc in route_docs}
         except Exception as e:
             logger.error(f"Error loading graph data: {e}")
+            if self._ready.is_set():
+                logger.warning("Keeping the previously loaded graph data")
+            return
+
+        try:
+            # Nothing from here on awaits, so requests never see a half-swapped graph
+            self._invalidate_derived_caches()
+            self.stops_cache = stops_cache
+            self.routes_cache = routes_cache
+            self._resolve_route_types()
+
+            self._intern_ids()
+            self._build_route_penalties()
+            self._build_route_stop_index()
+            self._build_graph_payloads()
+            self._build_graph_stats()
+            self._build_spatial_index()
+            self._build_adjacency()
+        except Exception as e:
+            logger.error(f"Error building graph data: {e}")
             # Initialize empty caches to prevent NoneType errors
             self.stops_cache = {}
             self.routes_cache = {}
+            self._ready.clear()
+            self._invalidate_derived_caches()
+            return
+
+        if self.stops_cache:
+            self._ready.set()
+        else:
+            self._ready.clear()
+
+        logger.info(
+            f"Graph data loaded: {len(self.stops_cache)} stops, {len(self.routes_cache)} routes")
 
     def get_stop_coordinates(self, stop_id: str) -> Tuple[float, float]:
         """Get latitude, longitude for a stop"""
-        if stop_id in self.stops_cache:
-            coords = self.stops_cache[stop_id].location.coordinates
-            return coords[1], coords[0]  # lat, lon (GeoJSON is [lon, lat])
-        return None, None
+        self._ensure_spatial_index()
+        i = self._idx_of.get(stop_id)
+        if i is None:
+            return None, None
+        return float(self._lat_deg[i]), float(self._lon_deg[i])
 
     def validate_coordinates(self, latitude: float, longitude: float) -> bool:
         """Validate if coordinates are reasonable"""
@@ -59,44 +427,55 @@ class GraphService:
             return False
 
         # Check if coordinates are within reasonable distance of any stop
-        if self.stops_cache:
-            min_distance = float('inf')
-            for stop in self.stops_cache.values():
-                stop_coords = (
-                    stop.location.coordinates[1], stop.location.coordinates[0])
-                distance = geodesic((latitude, longitude),
-                                    stop_coords).kilometers
-                min_distance = min(min_distance, distance)
-
+        self._ensure_spatial_index()
+        if len(self._stop_ids) == 0:
+            return True
+
+        # The radius is tens of km, so a ~100m grid is plenty and repeat queries are a dict hit
+        key = (round(latitude, 3), round(longitude, 3))
+        valid = self._valid_coords_cache.get(key)
+        if valid is None:
             # Reject coordinates more than configured distance from any stop
-            return min_distance <= settings.MAX_SEARCH_RADIUS_KM
+            valid = self._nearest_distance_km(*key) <= settings.MAX_SEARCH_RADIUS_KM
+            self._valid_coords_cache[key] = valid
+        return valid
 
-        return True
+    def _nearest_distance_km(self, latitude: float, longitude: float) -> float:
+        """Distance in km from a point to the closest stop"""
+        if self._stop_tree is not None:
+            _, distances = self._tree_candidates(latitude, longitude, 3)
+            return float(distances[0])
+        return float(self._distances_from(latitude, longitude).min())
 
     def calculate_walking_time_from_coords(self, lat: float, lon: float, stop_id: str) -> Tuple[int, float]:
         """Calculate walking time and distance from coordinates to stop"""
-        stop_coords = self.get_stop_coordinates(stop_id)
+        stop_lat, stop_lon = self.get_stop_coordinates(stop_id)
 
-        if not stop_coords:
+        if stop_lat is None:
             return float('inf'), 0.0
 
-        distance_km = geodesic((lat, lon), stop_coords).kilometers
+        distance_km = cheap_distance_km(lat, lon, stop_lat, stop_lon)
 
         if distance_km > settings.MAX_WALKING_DISTANCE_KM:
             return float('inf'), distance_km
 
+        return self._walk_from_distance(distance_km)
+
+    @staticmethod
+    def _walk_from_distance(distance_km: float) -> Tuple[int, float]:
+        """Walking time in minutes and distance for a walk already known to be in range"""
         walking_time_minutes = (distance_km / settings.WALKING_SPEED_KMH) * 60
         return int(walking_time_minutes), distance_km
 
     def calculate_walking_time(self, stop1_id: str, stop2_id: str) -> int:
         """Calculate walking time between two stops in minutes"""
-        coords1 = self.get_stop_coordinates(stop1_id)
-        coords2 = self.get_stop_coordinates(stop2_id)
+        lat1, lon1 = self.get_stop_coordinates(stop1_id)
+        lat2, lon2 = self.get_stop_coordinates(stop2_id)
 
-        if not coords1 or not coords2:
+        if lat1 is None or lat2 is None:
             return float('inf')
 
-        distance_km = geodesic(coords1, coords2).kilometers
+        distance_km = cheap_distance_km(lat1, lon1, lat2, lon2)
 
         if distance_km > settings.MAX_WALKING_DISTANCE_KM:
             return float('inf')
@@ -104,41 +483,137 @@ class GraphService:
         walking_time_minutes = (distance_km / settings.WALKING_SPEED_KMH) * 60
         return int(walking_time_minutes)
 
+    def search_stops(self, query: str, limit: int = 10) -> List[Dict]:
+        """Case-insensitive substring match on stop names over the cached graph"""
+        if self._name_index is None:
+            self._name_index = [(stop.name.lower(), stop) for stop in self.stops_cache.values()]
+
+        needle = query.lower()
+        suggestions = []
+        for name_lower, stop in self._name_index:
+            if needle in name_lower:
+                suggestions.append({
+                    "stop_id": stop.stop_id,
+                    "name": stop.name,
+                    "latitude": stop.location.coordinates[1],
+                    "longitude": stop.location.coordinates[0]
+                })
+                if len(suggestions) >= limit:
+                    break
+
+        return suggestions
+
     def find_nearest_stops(self, latitude: float, longitude: float, limit: int = 5) -> List[Tuple[str, float]]:
         """Find nearest stops to given coordinates with distances"""
-        distances = []
-
         logger.debug(f"Finding nearest stops to ({latitude}, {longitude})")
 
-        for stop_id, stop in self.stops_cache.items():
-            # MongoDB stores [longitude, latitude]
-            stop_coords = (
-                stop.location.coordinates[1], stop.location.coordinates[0])
-            distance = geodesic((latitude, longitude), stop_coords).kilometers
+        self._ensure_spatial_index()
+        if len(self._stop_ids) == 0 or limit <= 0:
+            return []
 
-            # Only include stops within maximum walking distance
-            if distance <= settings.MAX_WALKING_DISTANCE_KM:
-                distances.append((distance, stop_id, stop.name))
+        if self._stop_tree is not None:
+            indices, distances = self._nearest_by_tree(latitude, longitude, limit)
+        else:
+            indices, distances = self._nearest_by_scan(latitude, longitude, limit)
 
-        distances.sort()
+        # Only include stops within maximum walking distance
+        within = distances <= settings.MAX_WALKING_DISTANCE_KM
 
         logger.debug(
-            f"Found {len(distances)} stops within {settings.MAX_WALKING_DISTANCE_KM}km")
-        for i in range(min(limit, len(distances))):
-            dist, stop_id, name = distances[i]
-            logger.debug(f"  {i+1}. {stop_id} ({name}) - {dist:.3f}km")
-
-        return [(stop_id, dist) for dist, stop_id, _ in distances[:limit]]
+            f"Found {int(within.sum())} stops within {settings.MAX_WALKING_DISTANCE_KM}km")
+
+        return [(self._stop_ids[i], float(d)) for i, d in zip(indices[within], distances[within])]
+
+    def _nearest_by_tree(self, latitude: float, longitude: float, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest stops from the k-d tree, sorted by distance in km"""
+        # Over-fetch so projection error can't push a true neighbour out of the top k
+        indices, distances = self._tree_candidates(latitude, longitude, limit * 3)
+        return indices[:limit], distances[:limit]
+
+    def _tree_candidates(self, latitude: float, longitude: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Up to k stops nearest on the projected plane, re-ranked by haversine distance"""
+        k = min(k, len(self._stop_ids))
+        _, indices = self._stop_tree.query((latitude * KM_PER_DEG_LAT, longitude * self._kx), k=k)
+        indices = np.atleast_1d(indices)
+        distances = np.empty(len(indices))
+        haversine_into(math.radians(latitude), math.radians(longitude),
+                       self._lats[indices], self._lons[indices], distances)
+        order = np.argsort(distances, kind="stable")
+        return indices[order], distances[order]
+
+    def _nearest_by_scan(self, latitude: float, longitude: float, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest stops from a full vectorized scan, sorted by distance in km"""
+        distances = self._distances_from(latitude, longitude)
+        candidates = np.arange(len(distances))
+
+        # Select the top-k without sorting every stop
+        if limit < len(candidates):
+            candidates = np.argpartition(distances, limit)[:limit]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+
+        return candidates, distances[candidates]
+
+    def _intern_ids(self):
+        """
+        Intern stop and route ids so the caches and indexes keyed on them share one string
+        object per id; equal ids then compare by identity instead of character by character
+        """
+        intern = sys.intern
+        for stop in self.stops_cache.values():
+            stop.stop_id = intern(stop.stop_id)
+            for connection in stop.connections:
+                connection.to_stop_id = intern(connection.to_stop_id)
+                connection.route_id = intern(connection.route_id)
+        for route_doc in self.routes_cache.values():
+            route_doc["route_id"] = intern(route_doc["route_id"])
+            if "stops" in route_doc:
+                route_doc["stops"] = [intern(stop_id) for stop_id in route_doc["stops"]]
+        self.stops_cache = {stop.stop_id: stop for stop in self.stops_cache.values()}
+        self.routes_cache = {route_doc["route_id"]: route_doc for route_doc in self.routes_cache.values()}
+
+    def _resolve_route_types(self):
+        """Fill in each route's route_type once per graph load so segments carry it from construction"""
+        for route_id, route_doc in self.routes_cache.items():
+            if not route_doc.get("route_type"):
+                route_doc["route_type"] = "metro" if "METRO" in route_id else "bus"
+
+    def _build_route_penalties(self):
+        """Resolve boarding/transfer penalties for every route once per graph load"""
+        self._route_penalties = {
+            route_id: (
+                settings.METRO_BOARDING_TIME if route.get("route_type", "bus") == "metro"
+                else settings.BUS_BOARDING_TIME,  # bus or other
+                settings.TRANSFER_WALKING_TIME
+            )
+            for route_id, route in self.routes_cache.items()
+        }
+
+    def _build_route_stop_index(self):
+        """Index which routes serve each stop and where, once per graph load"""
+        stop_to_routes: Dict[str, Set[str]] = {}
+        route_stops_pos: Dict[str, Dict[str, int]] = {}
+        route_cumtime: Dict[str, np.ndarray] = {}
+        route_cumcost: Dict[str, np.ndarray] = {}
+        for route_id, route_doc in self.routes_cache.items():
+            stops = route_doc.get("stops", [])
+            positions = route_stops_pos.setdefault(route_id, {})
+            for pos, stop_id in enumerate(stops):
+                stop_to_routes.setdefault(stop_id, set()).add(route_id)
+                # Keep the first occurrence, as list.index would
+                positions.setdefault(stop_id, pos)
+            # Flat per-stop estimates until routes carry real segment timings
+            route_cumtime[route_id] = np.arange(len(stops), dtype=np.int64) * _ROUTE_STOP_MINUTES
+            route_cumcost[route_id] = np.arange(len(stops), dtype=np.float64) * _ROUTE_STOP_COST
+        self._stop_to_routes = stop_to_routes
+        self._route_stops_pos = route_stops_pos
+        self._route_cumtime = route_cumtime
+        self._route_cumcost = route_cumcost
 
     def get_mode_specific_penalties(self, route_id: str) -> Tuple[int, int]:
         """Get boarding time and transfer penalties based on route type"""
-        route_info = self.routes_cache.get(route_id, {})
-        route_type = route_info.get("route_type", "bus")
-
-        if route_type == "metro":
-            return settings.METRO_BOARDING_TIME, settings.TRANSFER_WALKING_TIME
-        else:  # bus or other
-            return settings.BUS_BOARDING_TIME, settings.TRANSFER_WALKING_TIME
+        if self._route_penalties is None:
+            self._build_route_penalties()
+        return self._route_penalties.get(route_id, _DEFAULT_PENALTIES)
 
     async def find_optimal_route(
         self,
@@ -151,8 +626,7 @@ class GraphService:
         """
         Find optimal route using enhanced Dijkstra's algorithm with realistic transit features
         """
-        if not self.stops_cache:
-            await self.load_graph_data()
+        await self.wait_until_ready()
 
         logger.info(
             f"Finding route from ({start_lat}, {start_lon}) to ({end_lat}, {end_lon}) "
@@ -168,49 +642,42 @@ class GraphService:
             logger.error(f"Invalid end coordinates: ({end_lat}, {end_lon})")
             return None
 
-        # Find nearest stops to start and end with distances
+        # Find nearest stops to start and end with distances; the multi-source search
+        # takes them all at once, so candidates cost little beyond seeding the queue
         start_stops_with_dist = self.find_nearest_stops(
-            start_lat, start_lon, 3)
-        end_stops_with_dist = self.find_nearest_stops(end_lat, end_lon, 3)
+            start_lat, start_lon, settings.ROUTE_CANDIDATE_STOPS)
+        end_stops_with_dist = self.find_nearest_stops(
+            end_lat, end_lon, settings.ROUTE_CANDIDATE_STOPS)
 
         if not start_stops_with_dist or not end_stops_with_dist:
             logger.error("No nearby stops found within walking distance")
             return None
 
-        start_stops = [stop_id for stop_id, _ in start_stops_with_dist]
-        end_stops = [stop_id for stop_id, _ in end_stops_with_dist]
+        # (walking minutes, km) from each end to its candidate stops, nearest first. The
+        # distances are the ones the candidates were admitted by, so none can fall outside
+        # walking range by being measured again with a different metric
+        start_walks = {stop_id: self._walk_from_distance(distance_km)
+                       for stop_id, distance_km in start_stops_with_dist}
+        end_walks = {stop_id: self._walk_from_distance(distance_km)
+                     for stop_id, distance_km in end_stops_with_dist}
 
-        logger.debug(f"Start stops: {start_stops}")
-        logger.debug(f"End stops: {end_stops}")
+        logger.debug(f"Start stops: {list(start_walks)}")
+        logger.debug(f"End stops: {list(end_walks)}")
 
-        best_route = None
-        best_cost = float('inf')
+        best_route = self._walk_only_route(start_walks, end_walks, optimize_for)
 
-        # Try all combinations of start and end stops
-        for i, start_stop in enumerate(start_stops):
-            for j, end_stop in enumerate(end_stops):
-                logger.debug(f"Trying route: {start_stop} → {end_stop}")
-                route = await self._dijkstra_with_transfers(start_stop, end_stop, optimize_for)
-                if route:
-                    # Add walking times and distances
-                    start_walking_time, start_walking_dist = self.calculate_walking_time_from_coords(
-                        start_lat, start_lon, start_stop)
-                    end_walking_time, end_walking_dist = self.calculate_walking_time_from_coords(
-                        end_lat, end_lon, end_stop)
-
-                    route.walking_time = start_walking_time + end_walking_time
-                    route.total_distance_km = start_walking_dist + end_walking_dist
-                    route.total_time += route.walking_time
-
-                    route_cost = self._calculate_total_cost(
-                        route, optimize_for)
-                    logger.debug(f"Found route with cost: {route_cost}")
-
-                    if route_cost < best_cost:
-                        best_route = route
-                        best_cost = route_cost
-                else:
-                    logger.debug("No route found")
+        if best_route is None:
+            # One search seeded from every start stop covers all start/end combinations
+            best_route = self._multi_source_route(start_walks, end_walks, optimize_for)
+
+        if best_route is None:
+            # The network search found nothing; fall back to per-pair lookups, which can
+            # also match routes that serve both stops. Every pair is its own search, so
+            # only the nearest few stops at each end are tried
+            best_route = await self._best_route_over_pairs(
+                dict(islice(start_walks.items(), _FALLBACK_PAIR_STOPS)),
+                dict(islice(end_walks.items(), _FALLBACK_PAIR_STOPS)),
+                optimize_for)
 
         if best_route:
             logger.info(f"Best route found: {' → '.join(best_route.path)} "
@@ -221,35 +688,152 @@ class GraphService:
 
         return best_route
 
+    def _walk_only_route(
+        self,
+        start_walks: Dict[str, Tuple[int, float]],
+        end_walks: Dict[str, Tuple[int, float]],
+        optimize_for: str
+    ) -> Optional[OptimizedRoute]:
+        """
+        Walking route through a stop near both ends, returned only when no transit
+        route can beat it, so the network search can be skipped
+        """
+        shared = [stop_id for stop_id in start_walks if stop_id in end_walks]
+        if not shared:
+            return None
+
+        stop_id = min(shared, key=lambda s: start_walks[s][0] + end_walks[s][0])
+        walking_time = start_walks[stop_id][0] + end_walks[stop_id][0]
+
+        # Walking is free, so it always wins on cost. Otherwise any transit route takes at
+        # least the shortest walk at each end plus one boarding
+        if optimize_for != "cost":
+            self._ensure_adjacency()
+            lower_bound = (min(walk[0] for walk in start_walks.values())
+                           + min(walk[0] for walk in end_walks.values())
+                           + min(self._route_boarding, default=0))
+            if walking_time > lower_bound:
+                return None
+
+        route = self._same_stop_route(stop_id)
+        self._add_walking(route, start_walks[stop_id], end_walks[stop_id])
+        return route
+
+    def _multi_source_route(
+        self,
+        start_walks: Dict[str, Tuple[int, float]],
+        end_walks: Dict[str, Tuple[int, float]],
+        optimize_for: str
+    ) -> Optional[OptimizedRoute]:
+        """Single Dijkstra run from all start stops to the cheapest end stop, walking included"""
+        self._ensure_adjacency()
+
+        # Walking adds to time-based priorities but not to fares
+        def walking_offset(minutes: int) -> int:
+            return 0 if optimize_for == "cost" else minutes
+
+        sources = {self._stop_index[stop_id]: walking_offset(walk[0]) for stop_id, walk in start_walks.items()}
+        targets = {self._stop_index[stop_id]: walking_offset(walk[0]) for stop_id, walk in end_walks.items()}
+
+        result = self._search(sources, targets, optimize_for, max_transfers=5)
+        if result is None:
+            return None
+
+        path, edges, transfers, total_time, total_cost = result
+        start_stop = self._stop_order[path[0]]
+        end_stop = self._stop_order[path[-1]]
+        if len(path) == 1:
+            route = self._same_stop_route(start_stop)
+        else:
+            route = self._route_from_edges(path, edges, transfers, total_time, total_cost)
+
+        self._add_walking(route, start_walks[start_stop], end_walks[end_stop])
+        return route
+
+    @staticmethod
+    def _add_walking(route: OptimizedRoute, start_walk: Tuple[int, float], end_walk: Tuple[int, float]):
+        """
+        Add the walks at each end to route. The per-end times are kept so the enhancer
+        can reuse them instead of measuring the same walks again
+        """
+        route.start_walking_time, start_walking_dist = start_walk
+        route.end_walking_time, end_walking_dist = end_walk
+        route.walking_time = route.start_walking_time + route.end_walking_time
+        route.total_distance_km = start_walking_dist + end_walking_dist
+        route.total_time += route.walking_time
+
+    async def _best_route_over_pairs(
+        self,
+        start_walks: Dict[str, Tuple[int, float]],
+        end_walks: Dict[str, Tuple[int, float]],
+        optimize_for: str
+    ) -> Optional[OptimizedRoute]:
+        """Best route over every start/end stop pair, searched one pair at a time"""
+        best_route = None
+        best_cost = float('inf')
+
+        # Try combinations with the least walking first
+        pairs = sorted(
+            ((start_stop, end_stop) for start_stop in start_walks for end_stop in end_walks),
+            key=lambda pair: start_walks[pair[0]][0] + end_walks[pair[1]][0]
+        )
+        for start_stop, end_stop in pairs:
+            # A time-optimized route costs at least its walking, so later pairs can't win
+            if optimize_for == "time" and best_cost <= start_walks[start_stop][0] + end_walks[end_stop][0]:
+                break
+
+            logger.debug(f"Trying route: {start_stop} → {end_stop}")
+            route = await self._dijkstra_with_transfers(start_stop, end_stop, optimize_for)
+            if route:
+                self._add_walking(route, start_walks[start_stop], end_walks[end_stop])
+
+                route_cost = self._calculate_total_cost(
+                    route, optimize_for)
+                logger.debug(f"Found route with cost: {route_cost}")
+
+                if route_cost < best_cost:
+                    best_route = route
+                    best_cost = route_cost
+            else:
+                logger.debug("No route found")
+
+        return best_route
+
+    async def find_routes_from_stop(
+        self,
+        start_stop_id: str,
+        end_stop_ids: List[str],
+        optimize_for: str = "time"
+    ) -> Dict[str, Optional[OptimizedRoute]]:
+        """
+        Routes from one stop to each of several, as _dijkstra_with_transfers finds them;
+        destinations that need a network search all read it from one shortest-path tree
+        """
+        tree = None
+        if start_stop_id in self.stops_cache and len(end_stop_ids) > 1:
+            self._ensure_adjacency()
+            tree = self._shortest_path_tree(self._stop_index[start_stop_id], optimize_for, 5)
+
+        return {end_stop_id: await self._dijkstra_with_transfers(start_stop_id, end_stop_id, optimize_for, tree)
+                for end_stop_id in end_stop_ids}
+
     async def _dijkstra_with_transfers(
         self,
         start_stop_id: str,
         end_stop_id: str,
-        optimize_for: str
+        optimize_for: str,
+        tree: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
     ) -> Optional[OptimizedRoute]:
         """
-        Find optimal route using proper Dijkstra's algorithm with transfers
+        Find optimal route using proper Dijkstra's algorithm with transfers.
+        A shortest-path tree from start_stop_id, if given, replaces the search.
         """
         if start_stop_id not in self.stops_cache or end_stop_id not in self.stops_cache:
             return None
 
         # Handle same start and end stop
         if start_stop_id == end_stop_id:
-            return OptimizedRoute(
-                path=[start_stop_id],
-                segments=[],
-                total_time=0,
-                total_cost=0.0,
-                transfers=0,
-                walking_time=0,
-                total_distance_km=0.0,
-                start_walking_time=0,
-                end_walking_time=0,
-                route_summary="Already at destination",
-                alternative_routes_count=0,
-                co2_saved_kg=0.0,
-                calories_burned=0
-            )
+            return self._same_stop_route(start_stop_id)
 
         start_stop = self.stops_cache[start_stop_id]
         end_stop = self.stops_cache[end_stop_id]
@@ -260,13 +844,13 @@ class GraphService:
                 return self._create_route_from_connection(connection, start_stop, end_stop)
 
         # Method 2: Find routes that serve both stops
-        route_match = await self._find_route_serving_both_stops(start_stop_id, end_stop_id)
+        route_match = self._find_route_serving_both_stops(start_stop_id, end_stop_id)
         if route_match:
             return route_match
 
         # Method 3: Use proper Dijkstra to find multi-hop routes
         logger.info(f"No direct route found, using Dijkstra for {start_stop_id} -> {end_stop_id}")
-        dijkstra_route = self._dijkstra_pathfinding(start_stop_id, end_stop_id, optimize_for)
+        dijkstra_route = self._dijkstra_pathfinding(start_stop_id, end_stop_id, optimize_for, tree=tree)
         if dijkstra_route:
             return dijkstra_route
 
@@ -274,131 +858,632 @@ class GraphService:
         logger.warning(f"No route found between {start_stop_id} and {end_stop_id}")
         return None
 
+    def _same_stop_route(self, stop_id: str) -> OptimizedRoute:
+        """Trivial route when the start and end stop coincide"""
+        return OptimizedRoute(
+            path=[stop_id],
+            segments=[],
+            total_time=0,
+            total_cost=0.0,
+            transfers=0,
+            walking_time=0,
+            total_distance_km=0.0,
+            start_walking_time=0,
+            end_walking_time=0,
+            route_summary="Already at destination",
+            alternative_routes_count=0,
+            co2_saved_kg=0.0,
+            calories_burned=0
+        )
+
     def _dijkstra_pathfinding(
         self,
         start_stop_id: str,
         end_stop_id: str,
         optimize_for: str,
-        max_transfers: int = 5
+        max_transfers: int = 5,
+        step_sink: Optional[List[Dict]] = None,
+        tree: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
     ) -> Optional[OptimizedRoute]:
         """
-        Proper Dijkstra pathfinding with transfers support
+        Proper Dijkstra pathfinding with transfers support.
+        If step_sink is given, visualization steps are appended to it as the search runs.
+        tree, if given, is the shortest-path tree from start_stop_id for these settings.
         """
-        # Counter to ensure unique priorities and avoid comparison issues
-        counter = itertools.count()
-        
-        # Priority queue: (cost, counter, current_stop, path, segments, transfers, total_time, total_cost)
-        pq = [(0, next(counter), start_stop_id, [start_stop_id], [], 0, 0, 0.0)]
+        self._ensure_adjacency()
+        start = self._stop_index[start_stop_id]
+        end = self._stop_index[end_stop_id]
+
+        if step_sink is not None:
+            # Only the Python search can report its progress
+            result = self._dijkstra_search({start: 0}, {end: 0}, optimize_for, max_transfers, step_sink)
+        elif tree is not None or self._origin_repeats(start, optimize_for, max_transfers):
+            if tree is None:
+                tree = self._shortest_path_tree(start, optimize_for, max_transfers)
+            result = self._path_from_tree(tree, start, end)
+        elif dijkstra_csr is None and self._is_long_query(start_stop_id, end_stop_id):
+            # Without the compiled kernel, meeting in the middle halves the explored stops
+            result = self._bidirectional_search(start, end, optimize_for, max_transfers)
+        else:
+            # A one-off origin: stop as soon as the destination is settled
+            result = self._search({start: 0}, {end: 0}, optimize_for, max_transfers)
+        if result is None:
+            logger.info(f"No path found between {start_stop_id} and {end_stop_id}")
+            return None
+
+        path, edges, transfers, total_time, total_cost = result
+        route = self._route_from_edges(path, edges, transfers, total_time, total_cost)
+        logger.info(f"Found path: {' -> '.join(route.path)} with {transfers} transfers")
+        return route
+
+    def _search(
+        self,
+        sources: Dict[int, float],
+        targets: Dict[int, float],
+        optimize_for: str,
+        max_transfers: int
+    ) -> Optional[Tuple[List[int], List[int], int, int, float]]:
+        """
+        Best path from any source to any target; both map stop index -> priority offset
+        (e.g. walking time). Uses the compiled kernel when Numba is available; both
+        searches give identical results.
+        """
+        if dijkstra_csr is not None:
+            return self._dijkstra_compiled(sources, targets, optimize_for, max_transfers)
+        return self._dijkstra_search(sources, targets, optimize_for, max_transfers)
+
+    def _dijkstra_compiled(
+        self,
+        sources: Dict[int, float],
+        targets: Dict[int, float],
+        optimize_for: str,
+        max_transfers: int
+    ) -> Optional[Tuple[List[int], List[int], int, int, float]]:
+        """Run the Numba kernel and rebuild the path from its parent arrays"""
+        target_offsets = np.full(len(self._stop_order), np.inf)
+        for stop, offset in targets.items():
+            target_offsets[stop] = offset
+
+        end, prev_stop, prev_edge, g_time, g_cost, g_transfers = dijkstra_csr(
+            self._indptr, self._indices, self._times, self._costs, self._route_idx,
+            self._route_boarding_arr, settings.TRANSFER_WALKING_TIME,
+            np.array(list(sources.keys()), dtype=np.int64),
+            np.array(list(sources.values()), dtype=np.float64),
+            target_offsets, OPTIMIZE_MODES.get(optimize_for, MODE_TRANSFERS), max_transfers
+        )
+        if end < 0:
+            return None
+
+        path, edges = self._walk_prev_arrays(prev_stop, prev_edge, end)
+        return path, edges, int(g_transfers[end]), int(g_time[end]), float(g_cost[end])
+
+    def _origin_repeats(self, start: int, optimize_for: str, max_transfers: int) -> bool:
+        """
+        Whether start was searched from recently with the same settings. A full tree costs
+        more than a search that stops at its destination, so it is only built for origins
+        that come back
+        """
+        key = (self._generation, start, optimize_for, max_transfers)
+        if key in self._sssp_cache or key in self._sssp_origins:
+            return True
+        self._sssp_origins[key] = True
+        return False
+
+    def _shortest_path_tree(
+        self,
+        start: int,
+        optimize_for: str,
+        max_transfers: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (prev_stop, prev_edge, g_time, g_cost, g_transfers) for a search from start with
+        no targets, so it settles every reachable stop. A stop's label is final once
+        settled, so any destination read from the tree matches a search that stopped there.
+        Uses the compiled kernel when Numba is available, else the Python search.
+        """
+        key = (self._generation, start, optimize_for, max_transfers)
+        tree = self._sssp_cache.get(key)
+        if tree is None:
+            if dijkstra_csr is not None:
+                _, prev_stop, prev_edge, g_time, g_cost, g_transfers = dijkstra_csr(
+                    self._indptr, self._indices, self._times, self._costs, self._route_idx,
+                    self._route_boarding_arr, settings.TRANSFER_WALKING_TIME,
+                    np.array([start], dtype=np.int64), np.zeros(1),
+                    np.full(len(self._stop_order), np.inf),
+                    OPTIMIZE_MODES.get(optimize_for, MODE_TRANSFERS), max_transfers
+                )
+                tree = (prev_stop, prev_edge, g_time, g_cost, g_transfers)
+            else:
+                tree = self._python_shortest_path_tree(start, optimize_for, max_transfers)
+            self._sssp_cache[key] = tree
+        return tree
+
+    def _python_shortest_path_tree(
+        self,
+        start: int,
+        optimize_for: str,
+        max_transfers: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Run the Python search with no targets and pack its labels like the kernel's arrays"""
+        labels: Dict[str, Dict] = {}
+        self._dijkstra_search({start: 0}, {}, optimize_for, max_transfers, labels=labels)
+
+        n = len(self._stop_order)
+        prev_stop = np.full(n, -1, dtype=np.int64)
+        prev_edge = np.full(n, -1, dtype=np.int64)
+        g_time = np.zeros(n, dtype=np.int64)
+        g_cost = np.zeros(n, dtype=np.float64)
+        g_transfers = np.zeros(n, dtype=np.int64)
+        for stop, step in labels["came_from"].items():
+            if step is not None:
+                prev_stop[stop], prev_edge[stop] = step
+            g_time[stop] = labels["g_time"][stop]
+            g_cost[stop] = labels["g_cost"][stop]
+            g_transfers[stop] = labels["g_transfers"][stop]
+        return prev_stop, prev_edge, g_time, g_cost, g_transfers
+
+    def _path_from_tree(
+        self,
+        tree: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        start: int,
+        end: int
+    ) -> Optional[Tuple[List[int], List[int], int, int, float]]:
+        """Read the path to end out of a shortest-path tree rooted at start"""
+        prev_stop, prev_edge, g_time, g_cost, g_transfers = tree
+        if end != start and prev_stop[end] < 0:
+            return None
+        path, edges = self._walk_prev_arrays(prev_stop, prev_edge, end)
+        return path, edges, int(g_transfers[end]), int(g_time[end]), float(g_cost[end])
+
+    @staticmethod
+    def _walk_prev_arrays(prev_stop: np.ndarray, prev_edge: np.ndarray, end: int) -> Tuple[List[int], List[int]]:
+        """Rebuild the stop and edge sequence ending at end from the kernel's parent arrays"""
+        path, edges = [end], []
+        stop = end
+        while prev_stop[stop] >= 0:
+            edges.append(int(prev_edge[stop]))
+            stop = int(prev_stop[stop])
+            path.append(stop)
+        path.reverse()
+        edges.reverse()
+        return path, edges
+
+    def _dijkstra_search(
+        self,
+        sources: Dict[int, float],
+        targets: Dict[int, float],
+        optimize_for: str,
+        max_transfers: int,
+        step_sink: Optional[List[Dict]] = None,
+        labels: Optional[Dict[str, Dict]] = None
+    ) -> Optional[Tuple[List[int], List[int], int, int, float]]:
+        """
+        Pure-Python search over the CSR arrays; returns (path, edges, transfers, time, cost).
+        Visualization steps go to step_sink, if given, until the destination is found or
+        _MAX_VISUALIZATION_STEPS are recorded. If labels is given, the final per-stop
+        came_from, g_time, g_cost and g_transfers dicts are stored in it.
+        """
+        indptr = self._indptr
+        indices, times, costs, route_idx = self._indices, self._times, self._costs, self._route_idx
+        route_boarding = self._route_boarding
+        transfer_time = settings.TRANSFER_WALKING_TIME
+
+        # One queue entry per stop, lowered in place when a better path turns up; per-stop
+        # state lives in the dicts below. Priorities never decrease along a path, so a
+        # stop's state is final once it is popped
+        pq = IndexedDHeap(len(self._stop_order))
         # Track best cost to each stop to avoid revisiting with worse cost
-        best_costs = {start_stop_id: 0}
+        best_costs = {}
+        # stop -> (previous stop, edge) on the best path found so far
+        came_from: Dict[int, Optional[Tuple[int, int]]] = {}
+        g_time, g_cost, g_transfers, g_route, g_offset = {}, {}, {}, {}, {}
+        # Seed every source at once, offset by its cost to reach it
+        for source, offset in sources.items():
+            best_costs[source] = offset
+            came_from[source] = None
+            g_time[source] = 0
+            g_cost[source] = 0.0
+            g_transfers[source] = 0
+            g_route[source] = -1
+            g_offset[source] = offset
+            pq.push_or_decrease(source, offset)
+
+        best_end, best_total = None, float('inf')
+        # Best total seen at any destination so far, popped or not; a label that already
+        # costs this much can't lead to a cheaper route, so it is never queued
+        upper = float('inf')
+
+        recording = step_sink is not None
+        settled: List[int] = []
+        if recording:
+            start = next(iter(sources))
+            self._record_step(
+                step_sink, "initialize",
+                f"Initialize algorithm with start node: {self._stop_order[start]}",
+                start, pq, came_from, settled)
         
         while pq:
-            current_cost, _, current_stop, path, segments, transfers, total_time, total_cost = heapq.heappop(pq)
+            current_stop, current_cost = pq.pop_min()
             
-            # Skip if we've found a better path to this stop already
-            if current_stop in best_costs and current_cost > best_costs[current_stop]:
-                continue
+            # Nothing left in the queue can beat the best destination reached so far
+            if current_cost >= best_total:
+                break
             
-            # Found destination
-            if current_stop == end_stop_id:
-                logger.info(f"Found path: {' -> '.join(path)} with {transfers} transfers")
-                
-                return OptimizedRoute(
-                    path=path,
-                    segments=segments,
-                    total_time=total_time,
-                    total_cost=total_cost,
-                    transfers=transfers,
-                    walking_time=0,
-                    total_distance_km=0.0,
-                    start_walking_time=0,
-                    end_walking_time=0,
-                    route_summary=f"Route with {len(segments)} segments, {transfers} transfers",
-                    alternative_routes_count=0,
-                    co2_saved_kg=total_time * 0.1,
-                    calories_burned=0
-                )
+            transfers = g_transfers[current_stop]
+            if recording:
+                settled.append(current_stop)
+            
+            # Reached a destination; keep going in case another one ends up cheaper overall
+            if current_stop in targets:
+                total = current_cost + targets[current_stop]
+                if total < best_total:
+                    best_end, best_total = current_stop, total
+                    if recording:
+                        path = self._stop_path(came_from, current_stop)
+                        self._record_step(
+                            step_sink, "found_destination",
+                            f"Destination {path[-1]} found! Path: {' → '.join(path)}",
+                            current_stop, None, came_from, settled,
+                            found_destination=True, final_path=path, total_cost=current_cost,
+                            segments_count=len(path) - 1, transfers=transfers)
+                        recording = False
+            elif recording:
+                self._record_step(
+                    step_sink, "process_node",
+                    f"Processing node {self._stop_order[current_stop]}, exploring neighbors",
+                    current_stop, pq, came_from, settled)
+                recording = len(step_sink) < _MAX_VISUALIZATION_STEPS
             
             # Skip if too many transfers
             if transfers >= max_transfers:
                 continue
+            
+            total_time = g_time[current_stop]
+            total_cost = g_cost[current_stop]
+            last_route = g_route[current_stop]
+            offset = g_offset[current_stop]
+            neighbors_added = [] if recording else None
                 
-            # Explore connections from current stop
-            if current_stop in self.stops_cache:
-                current_stop_obj = self.stops_cache[current_stop]
-                
-                for connection in current_stop_obj.connections:
-                    next_stop = connection.to_stop_id
-                    
-                    # Skip if already in path (avoid cycles)
-                    if next_stop in path:
-                        continue
-                        
-                    # Calculate costs
-                    segment_time = connection.time
-                    segment_cost = connection.cost
-                    
-                    # Add boarding time for first segment or if changing routes
+            # Explore connections from current stop as one contiguous slice
+            lo, hi = int(indptr[current_stop]), int(indptr[current_stop + 1])
+            for edge, next_stop, segment_time, segment_cost, route in zip(
+                range(lo, hi),
+                indices[lo:hi].tolist(),
+                times[lo:hi].tolist(),
+                costs[lo:hi].tolist(),
+                route_idx[lo:hi].tolist()
+            ):
+                # Add boarding time for first segment or if changing routes
+                is_transfer = False
+                if last_route < 0:
+                    boarding_penalty = route_boarding[route]
+                elif last_route != route:
+                    # Route change - this is a transfer
+                    boarding_penalty = route_boarding[route] + transfer_time
+                    is_transfer = True
+                else:
                     boarding_penalty = 0
-                    is_transfer = False
-                    
-                    if len(segments) == 0:
-                        # First segment - add boarding time
-                        boarding_time, _ = self.get_mode_specific_penalties(connection.route_id)
-                        boarding_penalty = boarding_time
-                    elif segments[-1].route_id != connection.route_id:
-                        # Route change - this is a transfer
-                        boarding_time, transfer_time = self.get_mode_specific_penalties(connection.route_id)
-                        boarding_penalty = boarding_time + transfer_time
-                        is_transfer = True
-                    
+                
+                new_time = total_time + segment_time + boarding_penalty
+                new_cost = total_cost + segment_cost
+                new_transfers = transfers + (1 if is_transfer else 0)
+                
+                # Calculate priority based on optimization criteria
+                if optimize_for == "time":
+                    priority = new_time
+                elif optimize_for == "cost":
+                    priority = new_cost
+                else:  # transfers
+                    priority = new_transfers * 100 + new_time
+                priority += offset
+                if priority >= upper:
+                    continue
+                
+                # Only add to queue if we found a better path to this stop. Edge weights are
+                # non-negative, so this also rejects cycles back onto the current path
+                if next_stop not in best_costs or priority < best_costs[next_stop]:
+                    if next_stop in targets:
+                        upper = min(upper, priority + targets[next_stop])
+                    best_costs[next_stop] = priority
+                    came_from[next_stop] = (current_stop, edge)
+                    g_time[next_stop] = new_time
+                    g_cost[next_stop] = new_cost
+                    g_transfers[next_stop] = new_transfers
+                    g_route[next_stop] = route
+                    g_offset[next_stop] = offset
+                    pq.push_or_decrease(next_stop, priority)
+                    if neighbors_added is not None:
+                        neighbors_added.append({
+                            "node": self._stop_order[next_stop],
+                            "cost": priority,
+                            "via_route": self._route_ids[route]
+                        })
+
+            if neighbors_added:
+                self._record_step(
+                    step_sink, "add_neighbors",
+                    f"Added {len(neighbors_added)} neighbors to priority queue",
+                    current_stop, pq, came_from, settled, neighbors_added=neighbors_added)
+                recording = len(step_sink) < _MAX_VISUALIZATION_STEPS
+        
+        if labels is not None:
+            labels.update(came_from=came_from, g_time=g_time, g_cost=g_cost, g_transfers=g_transfers)
+        if best_end is None:
+            return None
+        path, edges = self._walk_came_from(came_from, best_end)
+        return path, edges, g_transfers[best_end], g_time[best_end], g_cost[best_end]
+
+    def _is_long_query(self, start_stop_id: str, end_stop_id: str) -> bool:
+        """Whether two stops are far enough apart for a bidirectional search to pay off"""
+        start_lat, start_lon = self.get_stop_coordinates(start_stop_id)
+        end_lat, end_lon = self.get_stop_coordinates(end_stop_id)
+        if start_lat is None or end_lat is None:
+            return False
+        distance_km = cheap_distance_km(start_lat, start_lon, end_lat, end_lon)
+        return distance_km >= settings.BIDIRECTIONAL_SEARCH_MIN_KM
+
+    def _bidirectional_search(
+        self,
+        start: int,
+        end: int,
+        optimize_for: str,
+        max_transfers: int
+    ) -> Optional[Tuple[List[int], List[int], int, int, float]]:
+        """
+        Forward search from start and backward search from end over the reverse CSR,
+        stopping once the two frontiers can't improve on the best meeting point.
+        Same cost model as _dijkstra_search; a backward label defers the boarding
+        penalty of its first route until it is joined to a forward label.
+        """
+        if start == end:
+            return [start], [], 0, 0, 0.0
+
+        indptr, indices, times, costs, route_idx = (
+            self._indptr, self._indices, self._times, self._costs, self._route_idx)
+        rindptr, redges, edge_source = self._rindptr, self._redges, self._edge_source
+        route_boarding = self._route_boarding
+        transfer_time = settings.TRANSFER_WALKING_TIME
+        inf = float('inf')
+
+        def priority_of(time, cost, transfers):
+            if optimize_for == "time":
+                return time
+            elif optimize_for == "cost":
+                return cost
+            else:  # transfers
+                return transfers * 100 + time
+
+        # Heap entries are (priority, stop); the stop index breaks ties, so no counter is needed
+        # Forward labels: best path start -> stop; route is the last route ridden
+        f_pq = [(0, start)]
+        f_best, f_prev = {start: 0}, {start: None}
+        f_time, f_cost, f_transfers, f_route = {start: 0}, {start: 0.0}, {start: 0}, {start: -1}
+        # Backward labels: best path stop -> end; route is the first route ridden. final is
+        # 1 if the last edge into end is a transfer, -1 while the label has fewer than 2 edges
+        b_pq = [(0, end)]
+        b_best, b_next = {end: 0}, {end: None}
+        b_time, b_cost, b_transfers, b_route = {end: 0}, {end: 0.0}, {end: 0}, {end: -1}
+        b_final = {end: -1}
+
+        best_total, meet = inf, None
+
+        def join(stop):
+            """Penalty time and extra transfer for joining both labels at stop"""
+            forward_route, backward_route = f_route[stop], b_route[stop]
+            if backward_route < 0:
+                return 0, 0
+            if forward_route < 0:
+                return route_boarding[backward_route], 0
+            if forward_route != backward_route:
+                return route_boarding[backward_route] + transfer_time, 1
+            return 0, 0
+
+        def try_meet(stop):
+            nonlocal best_total, meet
+            if stop not in f_best or stop not in b_best:
+                return
+            penalty, extra = join(stop)
+            transfers = f_transfers[stop] + b_transfers[stop] + extra
+            # The forward search never expands a stop at max_transfers, so only the
+            # final edge may take a path up to the limit
+            if stop != end:
+                final = b_final[stop] if b_final[stop] >= 0 else extra
+                if transfers - final >= max_transfers:
+                    return
+            total_time = f_time[stop] + b_time[stop] + penalty
+            total_cost = f_cost[stop] + b_cost[stop]
+            total = priority_of(total_time, total_cost, transfers)
+            if total < best_total:
+                # Either label at stop may still improve later, so keep the links as they are now
+                best_total = total
+                meet = (stop, f_prev[stop], b_next[stop], transfers, total_time, total_cost)
+
+        while f_pq or b_pq:
+            top_f = f_pq[0][0] if f_pq else inf
+            top_b = b_pq[0][0] if b_pq else inf
+            # No unexplored path can beat the best meeting found so far
+            if top_f + top_b >= best_total:
+                break
+
+            if top_f <= top_b:
+                current_cost, current_stop = heapq.heappop(f_pq)
+                if current_cost > f_best[current_stop]:
+                    continue
+                transfers = f_transfers[current_stop]
+                if transfers >= max_transfers:
+                    continue
+                total_time, total_cost = f_time[current_stop], f_cost[current_stop]
+                last_route = f_route[current_stop]
+
+                lo, hi = int(indptr[current_stop]), int(indptr[current_stop + 1])
+                for edge, next_stop, segment_time, segment_cost, route in zip(
+                    range(lo, hi),
+                    indices[lo:hi].tolist(),
+                    times[lo:hi].tolist(),
+                    costs[lo:hi].tolist(),
+                    route_idx[lo:hi].tolist()
+                ):
+                    if last_route < 0:
+                        boarding_penalty, extra = route_boarding[route], 0
+                    elif last_route != route:
+                        boarding_penalty, extra = route_boarding[route] + transfer_time, 1
+                    else:
+                        boarding_penalty, extra = 0, 0
+
                     new_time = total_time + segment_time + boarding_penalty
                     new_cost = total_cost + segment_cost
-                    new_transfers = transfers + (1 if is_transfer else 0)
-                    
-                    # Calculate priority based on optimization criteria
-                    if optimize_for == "time":
-                        priority = new_time
-                    elif optimize_for == "cost":
-                        priority = new_cost
-                    else:  # transfers
-                        priority = new_transfers * 100 + new_time
-                    
-                    # Create segment
-                    current_stop_name = self.stops_cache[current_stop].name
-                    next_stop_name = self.stops_cache[next_stop].name
-                    route_info = self.routes_cache.get(connection.route_id, {})
-                    
-                    segment = RouteSegment(
-                        route_id=connection.route_id,
-                        route_name=route_info.get("route_long_name", f"Route {connection.route_id}"),
-                        route_type=route_info.get("route_type", "bus"),
-                        from_stop=current_stop,
-                        to_stop=next_stop,
-                        from_stop_name=current_stop_name,
-                        to_stop_name=next_stop_name,
-                        time=segment_time,
-                        cost=segment_cost,
-                        sequence_start=connection.sequence,
-                        sequence_end=connection.sequence + 1,
-                        boarding_time=boarding_penalty,
-                        transfer_time=0,
-                        walking_directions=[]
-                    )
-                    
-                    new_path = path + [next_stop]
-                    new_segments = segments + [segment]
-                    
-                    # Only add to queue if we found a better path to this stop
-                    if next_stop not in best_costs or priority < best_costs[next_stop]:
-                        best_costs[next_stop] = priority
-                        heapq.heappush(pq, (
-                            priority, next(counter), next_stop, new_path, new_segments,
-                            new_transfers, new_time, new_cost
-                        ))
-        
-        logger.info(f"No path found between {start_stop_id} and {end_stop_id}")
-        return None
+                    new_transfers = transfers + extra
+                    priority = priority_of(new_time, new_cost, new_transfers)
+
+                    if priority < f_best.get(next_stop, inf):
+                        f_best[next_stop] = priority
+                        f_prev[next_stop] = (current_stop, edge)
+                        f_time[next_stop] = new_time
+                        f_cost[next_stop] = new_cost
+                        f_transfers[next_stop] = new_transfers
+                        f_route[next_stop] = route
+                        heapq.heappush(f_pq, (priority, next_stop))
+                        try_meet(next_stop)
+            else:
+                current_cost, current_stop = heapq.heappop(b_pq)
+                if current_cost > b_best[current_stop]:
+                    continue
+                transfers = b_transfers[current_stop]
+                final = b_final[current_stop]
+                if transfers - max(final, 0) >= max_transfers:
+                    continue
+                total_time, total_cost = b_time[current_stop], b_cost[current_stop]
+                first_route = b_route[current_stop]
+
+                lo, hi = int(rindptr[current_stop]), int(rindptr[current_stop + 1])
+                for edge in redges[lo:hi].tolist():
+                    prev_stop = int(edge_source[edge])
+                    route = int(route_idx[edge])
+                    # Boarding of the route after this edge is charged once we know it's a change
+                    if first_route < 0 or first_route == route:
+                        boarding_penalty, extra = 0, 0
+                    else:
+                        boarding_penalty, extra = route_boarding[first_route] + transfer_time, 1
+
+                    new_time = total_time + int(times[edge]) + boarding_penalty
+                    new_cost = total_cost + float(costs[edge])
+                    new_transfers = transfers + extra
+                    priority = priority_of(new_time, new_cost, new_transfers)
+
+                    if priority < b_best.get(prev_stop, inf):
+                        b_best[prev_stop] = priority
+                        b_next[prev_stop] = (current_stop, edge)
+                        b_time[prev_stop] = new_time
+                        b_cost[prev_stop] = new_cost
+                        b_transfers[prev_stop] = new_transfers
+                        b_route[prev_stop] = route
+                        b_final[prev_stop] = final if final >= 0 or first_route < 0 else extra
+                        heapq.heappush(b_pq, (priority, prev_stop))
+                        try_meet(prev_stop)
+
+        if meet is None:
+            return None
+
+        meet_stop, forward_step, backward_step, transfers, total_time, total_cost = meet
+        # Labels behind the meeting stop were already settled and can't have changed
+        if forward_step is None:
+            path, edges = [meet_stop], []
+        else:
+            path, edges = self._walk_came_from(f_prev, forward_step[0])
+            path.append(meet_stop)
+            edges.append(forward_step[1])
+
+        step = backward_step
+        while step is not None:
+            next_stop, edge = step
+            path.append(next_stop)
+            edges.append(edge)
+            step = b_next[next_stop]
+
+        return path, edges, transfers, total_time, total_cost
+
+    @staticmethod
+    def _walk_came_from(
+        came_from: Dict[int, Optional[Tuple[int, int]]],
+        end: int
+    ) -> Tuple[List[int], List[int]]:
+        """Rebuild the stop and edge sequence ending at end from parent pointers"""
+        path, edges = [end], []
+        step = came_from[end]
+        while step is not None:
+            prev_stop, edge = step
+            path.append(prev_stop)
+            edges.append(edge)
+            step = came_from[prev_stop]
+        path.reverse()
+        edges.reverse()
+        return path, edges
+
+    def _route_from_edges(
+        self,
+        path: List[int],
+        edges: List[int],
+        transfers: int,
+        total_time: int,
+        total_cost: float
+    ) -> OptimizedRoute:
+        """Materialize the API models for a path found on the CSR arrays"""
+        stop_ids = [self._stop_order[i] for i in path]
+        stop_names = [self._stop_names[i] for i in path]
+
+        # Gather the per-edge columns once instead of indexing numpy scalars per segment
+        edge_idx = np.asarray(edges, dtype=np.int64)
+        routes = self._route_idx[edge_idx].tolist()
+        times = self._times[edge_idx].tolist()
+        costs = self._costs[edge_idx].tolist()
+        sequences = self._sequences[edge_idx].tolist()
+
+        boarding = []
+        last_route = -1
+        for route in routes:
+            if last_route < 0:
+                boarding.append(self._route_boarding[route])
+            elif last_route != route:
+                boarding.append(self._route_boarding[route] + settings.TRANSFER_WALKING_TIME)
+            else:
+                boarding.append(0)
+            last_route = route
+
+        segments = [
+            RouteSegment(
+                route_id=self._route_ids[route],
+                route_name=self._route_names[route],
+                route_type=self._route_types[route],
+                from_stop=stop_ids[k],
+                to_stop=stop_ids[k + 1],
+                from_stop_name=stop_names[k],
+                to_stop_name=stop_names[k + 1],
+                time=times[k],
+                cost=costs[k],
+                sequence_start=sequences[k],
+                sequence_end=sequences[k] + 1,
+                boarding_time=boarding[k],
+                transfer_time=0,
+                walking_directions=[]
+            )
+            for k, route in enumerate(routes)
+        ]
+
+        return OptimizedRoute(
+            path=stop_ids,
+            segments=segments,
+            total_time=total_time,
+            total_cost=total_cost,
+            transfers=transfers,
+            walking_time=0,
+            total_distance_km=0.0,
+            start_walking_time=0,
+            end_walking_time=0,
+            route_summary=f"Route with {len(segments)} segments, {transfers} transfers",
+            alternative_routes_count=0,
+            co2_saved_kg=total_time * 0.1,
+            calories_burned=0
+        )
 
     def _create_route_from_connection(self, connection, start_stop, end_stop):
         """Create route from existing connection data"""
@@ -406,7 +1491,7 @@ class GraphService:
         
         route_info = self.routes_cache.get(connection.route_id, {})
         route_name = route_info.get("route_long_name", f"Route {connection.route_id}")
-        route_type = route_info.get("route_type", "metro")
+        route_type = route_info.get("route_type", "bus")
         
         segment = RouteSegment(
             route_id=connection.route_id,
@@ -441,37 +1526,32 @@ class GraphService:
             calories_burned=0
         )
 
-    async def _find_route_serving_both_stops(self, start_stop_id: str, end_stop_id: str):
-        """Find a route that serves both stops by analyzing route data"""
-        db = await get_database()
-        
-        # Find routes that contain both stops
-        pipeline = [
-            {"$match": {"stops": {"$all": [start_stop_id, end_stop_id]}}},
-            {"$limit": 1}
-        ]
-        
-        async for route_doc in db.routes.aggregate(pipeline):
-            route_id = route_doc["route_id"]
-            stops_list = route_doc.get("stops", [])
-            
-            try:
-                start_idx = stops_list.index(start_stop_id)
-                end_idx = stops_list.index(end_stop_id)
-                
-                # Calculate travel details
-                stops_between = abs(end_idx - start_idx)
-                travel_time = stops_between * 3  # 3 minutes per stop
-                travel_cost = stops_between * 2.0  # 2 units per stop
-                
-                return self._create_route_from_data(
-                    route_id, route_doc, start_stop_id, end_stop_id, 
-                    travel_time, travel_cost, stops_between
-                )
-            except ValueError:
-                continue
-                
-        return None
+    def _find_route_serving_both_stops(self, start_stop_id: str, end_stop_id: str):
+        """Find a route that serves both stops using the in-memory route/stop index"""
+        if self._stop_to_routes is None:
+            self._build_route_stop_index()
+
+        common = (self._stop_to_routes.get(start_stop_id, set())
+                  & self._stop_to_routes.get(end_stop_id, set()))
+        if not common:
+            return None
+
+        # First matching route in load order, as the database scan would return
+        route_id = next(rid for rid in self._route_stops_pos if rid in common)
+        positions = self._route_stops_pos[route_id]
+        start_idx = positions[start_stop_id]
+        end_idx = positions[end_stop_id]
+
+        # Calculate travel details
+        stops_between = abs(end_idx - start_idx)
+        cumtime, cumcost = self._route_cumtime[route_id], self._route_cumcost[route_id]
+        travel_time = int(abs(cumtime[end_idx] - cumtime[start_idx]))
+        travel_cost = float(abs(cumcost[end_idx] - cumcost[start_idx]))
+
+        return self._create_route_from_data(
+            route_id, self.routes_cache[route_id], start_stop_id, end_stop_id,
+            travel_time, travel_cost, stops_between
+        )
 
     def _create_route_from_data(self, route_id, route_doc, start_stop_id, end_stop_id, 
                                travel_time, travel_cost, stops_between):
@@ -482,7 +1562,7 @@ class GraphService:
         end_stop = self.stops_cache[end_stop_id]
         
         route_name = route_doc.get("route_long_name", f"Route {route_id}")
-        route_type = route_doc.get("route_type", "metro")
+        route_type = route_doc.get("route_type", "bus")
         
         boarding_time, _ = self.get_mode_specific_penalties(route_id)
         
@@ -524,10 +1604,10 @@ class GraphService:
         from app.models.route import RouteSegment, OptimizedRoute
         
         # Calculate distance-based estimates
-        start_coords = (start_stop.location.coordinates[1], start_stop.location.coordinates[0])
-        end_coords = (end_stop.location.coordinates[1], end_stop.location.coordinates[0])
+        start_lon, start_lat = start_stop.location.coordinates[:2]
+        end_lon, end_lat = end_stop.location.coordinates[:2]
         
-        distance_km = geodesic(start_coords, end_coords).kilometers
+        distance_km = cheap_distance_km(start_lat, start_lon, end_lat, end_lon)
         
         # Reasonable metro estimates
         travel_time = max(5, int(distance_km * 4))  # ~4 minutes per km for metro
@@ -579,6 +1659,39 @@ class GraphService:
         else:  # transfers
             return route.transfers
 
+    def _stop_path(self, came_from: Dict[int, Optional[Tuple[int, int]]], stop: int) -> List[str]:
+        """Stop ids from the search start to stop"""
+        path, _ = self._walk_came_from(came_from, stop)
+        return [self._stop_order[i] for i in path]
+
+    def _record_step(
+        self,
+        steps: List[Dict],
+        action: str,
+        description: str,
+        current_stop: int,
+        pq: Optional[IndexedDHeap],
+        came_from: Dict[int, Optional[Tuple[int, int]]],
+        settled: List[int],
+        **extra
+    ):
+        """Append one visualization step describing the search state"""
+        stop_order = self._stop_order
+        steps.append({
+            "step": len(steps),
+            "action": action,
+            "description": description,
+            "current_node": stop_order[current_stop],
+            "priority_queue": [
+                {"node": stop_order[stop], "cost": pq.key[stop], "path": self._stop_path(came_from, stop)}
+                for stop in pq.heap[:5]
+            ] if pq is not None else [],
+            "visited": [stop_order[stop] for stop in settled],
+            "path": self._stop_path(came_from, current_stop),
+            "found_destination": False,
+            **extra
+        })
+
     async def get_algorithm_execution_steps(
         self,
         start_stop_id: str,
@@ -591,203 +1704,39 @@ class GraphService:
         if start_stop_id not in self.stops_cache or end_stop_id not in self.stops_cache:
             return []
 
-        steps = []
-        counter = itertools.count()
-        
-        # Priority queue: (cost, counter, current_stop, path, segments, transfers, total_time, total_cost)
-        pq = [(0, next(counter), start_stop_id, [start_stop_id], [], 0, 0, 0.0)]
-        visited = set()
-        step_count = 0
-        
-        # Initial state
-        steps.append({
-            "step": step_count,
-            "action": "initialize",
-            "description": f"Initialize algorithm with start node: {start_stop_id}",
-            "current_node": start_stop_id,
-            "priority_queue": [{"node": start_stop_id, "cost": 0, "path": [start_stop_id]}],
-            "visited": list(visited),
-            "path": [start_stop_id],
-            "found_destination": False
-        })
-        step_count += 1
-        
-        while pq and step_count < 100:  # Increased limit for visualization
-            current_cost, _, current_stop, path, segments, transfers, total_time, total_cost = heapq.heappop(pq)
-            
-            # Skip if already visited
-            if current_stop in visited:
-                steps.append({
-                    "step": step_count,
-                    "action": "skip_visited",
-                    "description": f"Node {current_stop} already visited, skipping",
-                    "current_node": current_stop,
-                    "priority_queue": [{"node": item[2], "cost": item[0], "path": item[3]} for item in pq[:5]],
-                    "visited": list(visited),
-                    "path": path,
-                    "found_destination": False
-                })
-                step_count += 1
-                continue
-                
-            visited.add(current_stop)
-            
-            # Check if destination found
-            if current_stop == end_stop_id:
-                steps.append({
-                    "step": step_count,
-                    "action": "found_destination",
-                    "description": f"Destination {end_stop_id} found! Path: {' → '.join(path)}",
-                    "current_node": current_stop,
-                    "priority_queue": [],
-                    "visited": list(visited),
-                    "path": path,
-                    "found_destination": True,
-                    "final_path": path,
-                    "total_cost": current_cost,
-                    "segments_count": len(segments),
-                    "transfers": transfers
-                })
-                break
-            
-            # Process current node
+        steps: List[Dict] = []
+        route = self._dijkstra_pathfinding(start_stop_id, end_stop_id, optimize_for, step_sink=steps)
+        last = steps[-1]
+        if last["found_destination"]:
+            return steps
+
+        if route is not None:
+            # The search went on past the recorded steps and found the destination
             steps.append({
-                "step": step_count,
-                "action": "process_node",
-                "description": f"Processing node {current_stop}, exploring neighbors",
-                "current_node": current_stop,
-                "priority_queue": [{"node": item[2], "cost": item[0], "path": item[3]} for item in pq[:5]],
-                "visited": list(visited),
-                "path": path,
-                "found_destination": False
+                "step": len(steps),
+                "action": "max_steps_reached",
+                "description": "Maximum visualization steps reached - algorithm continues in background",
+                "current_node": last["current_node"],
+                "priority_queue": [{"node": item["node"], "cost": item["cost"]} for item in last["priority_queue"]],
+                "visited": last["visited"],
+                "path": last["path"],
+                "found_destination": False,
+                "note": "The actual pathfinding algorithm continues beyond this limit"
             })
-            step_count += 1
-            
-            # Explore neighbors
-            if current_stop in self.stops_cache:
-                current_stop_obj = self.stops_cache[current_stop]
-                neighbors_added = []
-                
-                for connection in current_stop_obj.connections:
-                    next_stop = connection.to_stop_id
-                    
-                    if next_stop in path:  # Avoid cycles
-                        continue
-                        
-                    # Calculate costs
-                    segment_time = connection.time
-                    segment_cost = connection.cost
-                    
-                    # Add boarding time for first segment or if changing routes
-                    boarding_penalty = 0
-                    is_transfer = False
-                    
-                    if len(segments) == 0:
-                        boarding_time, _ = self.get_mode_specific_penalties(connection.route_id)
-                        boarding_penalty = boarding_time
-                    elif segments[-1]["route_id"] != connection.route_id:
-                        boarding_time, transfer_time = self.get_mode_specific_penalties(connection.route_id)
-                        boarding_penalty = boarding_time + transfer_time
-                        is_transfer = True
-                    
-                    new_time = total_time + segment_time + boarding_penalty
-                    new_cost = total_cost + segment_cost
-                    new_transfers = transfers + (1 if is_transfer else 0)
-                    
-                    # Calculate priority based on optimization criteria
-                    if optimize_for == "time":
-                        priority = new_time
-                    elif optimize_for == "cost":
-                        priority = new_cost
-                    else:  # transfers
-                        priority = new_transfers * 100 + new_time
-                    
-                    new_path = path + [next_stop]
-                    
-                    # Create dummy segment for tracking
-                    current_stop_name = self.stops_cache[current_stop].name
-                    next_stop_name = self.stops_cache[next_stop].name
-                    
-                    dummy_segment = {
-                        "route_id": connection.route_id,
-                        "from_stop": current_stop,
-                        "to_stop": next_stop,
-                        "time": segment_time,
-                        "cost": segment_cost
-                    }
-                    
-                    new_segments = segments + [dummy_segment]
-                    
-                    heapq.heappush(pq, (
-                        priority, next(counter), next_stop, new_path, new_segments,
-                        new_transfers, new_time, new_cost
-                    ))
-                    
-                    neighbors_added.append({
-                        "node": next_stop,
-                        "cost": priority,
-                        "via_route": connection.route_id
-                    })
-                
-                if neighbors_added:
-                    steps.append({
-                        "step": step_count,
-                        "action": "add_neighbors",
-                        "description": f"Added {len(neighbors_added)} neighbors to priority queue",
-                        "current_node": current_stop,
-                        "neighbors_added": neighbors_added,
-                        "priority_queue": [{"node": item[2], "cost": item[0], "path": item[3]} for item in pq[:5]],
-                        "visited": list(visited),
-                        "path": path,
-                        "found_destination": False
-                    })
-                    step_count += 1
-        
-        # Check final state after loop ends
-        if step_count >= 100:
-            # If we hit the step limit, check if there are still nodes to explore
-            if pq:
-                # Still have nodes to explore - hit visualization limit
-                steps.append({
-                    "step": step_count,
-                    "action": "max_steps_reached",
-                    "description": "Maximum visualization steps reached - algorithm continues in background",
-                    "current_node": current_stop if 'current_stop' in locals() else start_stop_id,
-                    "priority_queue": [{"node": item[2], "cost": item[0]} for item in pq[:5]],
-                    "visited": list(visited),
-                    "path": path if 'path' in locals() else [start_stop_id],
-                    "found_destination": False,
-                    "note": "The actual pathfinding algorithm continues beyond this limit"
-                })
-            else:
-                # No more nodes to explore - algorithm completed without finding route
-                steps.append({
-                    "step": step_count,
-                    "action": "no_route_found",
-                    "description": "Algorithm completed: All reachable nodes explored, no route to destination",
-                    "current_node": current_stop if 'current_stop' in locals() else start_stop_id,
-                    "priority_queue": [],
-                    "visited": list(visited),
-                    "path": path if 'path' in locals() else [start_stop_id],
-                    "found_destination": False,
-                    "no_route_available": True,
-                    "note": f"Explored {len(visited)} nodes - destination is not reachable from start point"
-                })
-        elif not pq:
-            # Loop ended because priority queue is empty (all reachable nodes explored)
+        else:
             steps.append({
-                "step": step_count,
+                "step": len(steps),
                 "action": "no_route_found",
                 "description": "Algorithm completed: All reachable nodes explored, no route to destination",
-                "current_node": current_stop if 'current_stop' in locals() else start_stop_id,
+                "current_node": last["current_node"],
                 "priority_queue": [],
-                "visited": list(visited),
-                "path": path if 'path' in locals() else [start_stop_id],
+                "visited": last["visited"],
+                "path": last["path"],
                 "found_destination": False,
                 "no_route_available": True,
-                "note": f"Explored {len(visited)} nodes - destination is not reachable from start point"
+                "note": f"Explored {len(last['visited'])} nodes - destination is not reachable from start point"
             })
-        
+
         return steps
 
 
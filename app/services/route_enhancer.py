@@ -3,11 +3,15 @@ Route Enhancement Service
 Adds additional features like walking directions, environmental impact, calories, etc.
 """
 from typing import List, Optional, Tuple
-from geopy.distance import geodesic
 import math
 
 from app.models.route import OptimizedRoute, RouteSegment, WalkingDirection
 from app.services.graph_service import graph_service
+from app.services._geo import cheap_distance_km
+
+# Compass points by 45° sector; North appears twice so bearings just under 360° wrap
+DIRECTIONS = ("North", "Northeast", "East", "Southeast",
+              "South", "Southwest", "West", "Northwest", "North")
 
 
 class RouteEnhancer:
@@ -18,6 +22,11 @@ class RouteEnhancer:
         self.WALKING_SPEED = 5.0
         self.BUS_SPEED = 20.0
         self.METRO_SPEED = 35.0
+        # Per transit mode: (minutes not spent moving, km per minute)
+        self._transit_speeds = {
+            "metro": (1, self.METRO_SPEED / 60),  # station stop
+            "bus": (2, self.BUS_SPEED / 60),  # traffic/stops
+        }
         
         # Environmental factors
         self.CO2_SAVED_PER_KM = 0.21  # kg CO2 saved per km vs private car
@@ -45,9 +54,6 @@ class RouteEnhancer:
         # Add walking directions for start and end
         route = self._add_walking_directions(route, start_lat, start_lon, end_lat, end_lon)
         
-        # Enhance individual segments
-        route.segments = [self._enhance_segment(seg) for seg in route.segments]
-        
         return route
     
     def _generate_route_summary(self, route: OptimizedRoute) -> str:
@@ -61,25 +67,25 @@ class RouteEnhancer:
         if route.start_walking_time > 0:
             summary_parts.append(f"Walk {route.start_walking_time}min to {route.segments[0].from_stop_name}")
         
-        # Transit segments
+        # Transit segments; route_type was resolved per route when the graph loaded
         current_route = None
+        route_type = None
         segment_count = 0
         
         for segment in route.segments:
             if segment.route_id != current_route:
                 if current_route is not None:
                     # Add previous route summary
-                    route_type = "metro" if "METRO" in current_route else "bus"
                     summary_parts.append(f"Take {route_type} {current_route} for {segment_count} stops")
                 
                 current_route = segment.route_id
+                route_type = segment.route_type
                 segment_count = 1
             else:
                 segment_count += 1
         
         # Add final route
         if current_route:
-            route_type = "metro" if "METRO" in current_route else "bus"
             summary_parts.append(f"Take {route_type} {current_route} for {segment_count} stops")
         
         # Walking from end
@@ -90,17 +96,13 @@ class RouteEnhancer:
     
     def _calculate_co2_saved(self, route: OptimizedRoute) -> float:
         """Calculate CO2 saved by using public transport vs private car"""
-        total_distance = route.total_distance_km
-        
-        # Add distance for all transit segments
-        for segment in route.segments:
-            if segment.route_type in ["bus", "metro"]:
-                # Estimate segment distance based on time and mode
-                if segment.route_type == "metro":
-                    segment_distance = (segment.time - 1) * (self.METRO_SPEED / 60)  # -1 for station stop
-                else:
-                    segment_distance = (segment.time - 2) * (self.BUS_SPEED / 60)  # -2 for traffic/stops
-                total_distance += max(0, segment_distance)
+        # Estimate each transit segment's distance from its time and mode
+        speeds = self._transit_speeds
+        total_distance = route.total_distance_km + sum(
+            max(0, (segment.time - speeds[segment.route_type][0]) * speeds[segment.route_type][1])
+            for segment in route.segments
+            if segment.route_type in speeds
+        )
         
         return round(total_distance * self.CO2_SAVED_PER_KM, 2)
     
@@ -119,22 +121,21 @@ class RouteEnhancer:
     ) -> OptimizedRoute:
         """Add walking directions for start and end of journey"""
         
+        # The walks were measured when the route was searched; only the directions are new here
         if route.segments:
             # Walking to first stop
             first_stop_id = route.segments[0].from_stop
-            if first_stop_id in graph_service.stops_cache:
-                first_stop = graph_service.stops_cache[first_stop_id]
-                start_walking_time, start_distance = graph_service.calculate_walking_time_from_coords(
-                    start_lat, start_lon, first_stop_id
-                )
-                route.start_walking_time = start_walking_time
+            first_stop_name = route.segments[0].from_stop_name
+            first_lat, first_lon = graph_service.get_stop_coordinates(first_stop_id)
+            if first_lat is not None:
+                start_walking_time = route.start_walking_time
                 
                 # Generate walking direction
                 if start_walking_time > 0:
                     direction = self._generate_walking_direction(
                         start_lat, start_lon,
-                        first_stop.location.coordinates[1], first_stop.location.coordinates[0],
-                        f"Walk to {first_stop.name}"
+                        first_lat, first_lon,
+                        f"Walk to {first_stop_name}"
                     )
                     
                     # Add as first segment if it's a walking segment
@@ -145,7 +146,7 @@ class RouteEnhancer:
                         from_stop="START",
                         to_stop=first_stop_id,
                         from_stop_name="Your Location",
-                        to_stop_name=first_stop.name,
+                        to_stop_name=first_stop_name,
                         time=start_walking_time,
                         cost=0.0,
                         sequence_start=0,
@@ -156,17 +157,15 @@ class RouteEnhancer:
             
             # Walking from last stop
             last_stop_id = route.segments[-1].to_stop
-            if last_stop_id in graph_service.stops_cache:
-                last_stop = graph_service.stops_cache[last_stop_id]
-                end_walking_time, end_distance = graph_service.calculate_walking_time_from_coords(
-                    end_lat, end_lon, last_stop_id
-                )
-                route.end_walking_time = end_walking_time
+            last_stop_name = route.segments[-1].to_stop_name
+            last_lat, last_lon = graph_service.get_stop_coordinates(last_stop_id)
+            if last_lat is not None:
+                end_walking_time = route.end_walking_time
                 
                 # Generate walking direction
                 if end_walking_time > 0:
                     direction = self._generate_walking_direction(
-                        last_stop.location.coordinates[1], last_stop.location.coordinates[0],
+                        last_lat, last_lon,
                         end_lat, end_lon,
                         f"Walk to destination"
                     )
@@ -178,7 +177,7 @@ class RouteEnhancer:
                         route_type="walking", 
                         from_stop=last_stop_id,
                         to_stop="END",
-                        from_stop_name=last_stop.name,
+                        from_stop_name=last_stop_name,
                         to_stop_name="Your Destination",
                         time=end_walking_time,
                         cost=0.0,
@@ -200,7 +199,8 @@ class RouteEnhancer:
     ) -> WalkingDirection:
         """Generate a walking direction between two points"""
         
-        distance_km = geodesic((from_lat, from_lon), (to_lat, to_lon)).kilometers
+        # Walking legs are under a kilometre, where the flat-earth distance is within 0.5%
+        distance_km = cheap_distance_km(from_lat, from_lon, to_lat, to_lon)
         distance_meters = int(distance_km * 1000)
         duration_seconds = int((distance_km / self.WALKING_SPEED) * 3600)
         
@@ -216,19 +216,6 @@ class RouteEnhancer:
             duration_seconds=duration_seconds
         )
     
-    def _enhance_segment(self, segment: RouteSegment) -> RouteSegment:
-        """Add enhanced information to a segment"""
-        
-        # Add route type based on route_id
-        if "METRO" in segment.route_id:
-            segment.route_type = "metro"
-        elif segment.route_id == "WALKING":
-            segment.route_type = "walking"
-        else:
-            segment.route_type = "bus"
-        
-        return segment
-    
     def _calculate_bearing(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate bearing between two points"""
         lat1_rad = math.radians(lat1)
@@ -246,10 +233,7 @@ class RouteEnhancer:
     
     def _bearing_to_direction(self, bearing: float) -> str:
         """Convert bearing to cardinal direction"""
-        directions = ["North", "Northeast", "East", "Southeast", 
-                     "South", "Southwest", "West", "Northwest", "North"]
-        index = int((bearing + 22.5) / 45)
-        return directions[index]
+        return DIRECTIONS[int((bearing + 22.5) // 45)]
 
 
 # Global instance
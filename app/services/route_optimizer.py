@@ -89,19 +89,40 @@
 # route_optimizer = RouteOptimizer()
 
 
-from typing import Optional, List, Dict
+import asyncio
+from typing import Optional, List, Dict, Tuple
 import logging
+from functools import partial
+from cachetools import LRUCache, TTLCache
+from fastapi.concurrency import run_in_threadpool
 from app.services.graph_service import graph_service
 from app.services.route_enhancer import route_enhancer
 from app.models.route import OptimizedRoute
 from app.database import get_database
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on stop-to-stop requests handled per batch
+BATCH_MAX_SIZE = 64
+
+StopRouteKey = Tuple[str, str, str]
+# (graph generation, start/end coordinates on a ~100m grid, optimize_for)
+RouteCacheKey = Tuple[int, int, int, int, int, str]
+
 
 class RouteOptimizer:
     def __init__(self):
-        self.cache: Dict[str, OptimizedRoute] = {}
+        # Enhanced coordinate routes; bounded so a stream of distinct coordinates can't grow it forever
+        self.cache: LRUCache = LRUCache(maxsize=settings.ROUTE_CACHE_SIZE)
+        # Searches still running, so concurrent identical requests share one instead of racing
+        self._inflight: Dict[RouteCacheKey, asyncio.Task] = {}
+        # Micro-batcher for concurrent stop-to-stop requests
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker: Optional[asyncio.Task] = None
+        self._batch_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Typeahead results keyed by (graph generation, normalized query, limit)
+        self._suggestion_cache: TTLCache = TTLCache(maxsize=10_000, ttl=settings.CACHE_TTL_SECONDS)
 
     async def find_route(
         self,
@@ -115,13 +136,37 @@ class RouteOptimizer:
         Find optimal route between two points
         """
         # Create cache key
-        cache_key = f"{start_lat:.4f},{start_lon:.4f}-{end_lat:.4f},{end_lon:.4f}-{optimize_for}"
+        cache_key = self._route_cache_key(start_lat, start_lon, end_lat, end_lon, optimize_for)
 
         # Check cache first
-        if cache_key in self.cache:
+        cached = self.cache.get(cache_key)
+        if cached is not None:
             logger.info(f"Cache hit for route: {cache_key}")
-            return self.cache[cache_key]
-
+            return cached
+
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(cache_key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(
+                self._search_route(cache_key, start_lat, start_lon, end_lat, end_lon, optimize_for))
+            self._inflight[cache_key] = task
+            task.add_done_callback(partial(self._clear_inflight, cache_key))
+        else:
+            logger.debug(f"Joining in-flight route search: {cache_key}")
+
+        # A cancelled caller must not cancel the search other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def _search_route(
+        self,
+        cache_key: RouteCacheKey,
+        start_lat: float,
+        start_lon: float,
+        end_lat: float,
+        end_lon: float,
+        optimize_for: str
+    ) -> Optional[OptimizedRoute]:
+        """Search, enhance and cache the route for one cache key"""
         # Find route using graph service
         route = await graph_service.find_optimal_route(
             start_lat, start_lon, end_lat, end_lon, optimize_for
@@ -140,28 +185,155 @@ class RouteOptimizer:
 
         return route
 
-    async def find_route_by_stops(
+    def _clear_inflight(self, cache_key: RouteCacheKey, task: asyncio.Task):
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+
+    @staticmethod
+    def _route_cache_key(
+        start_lat: float,
+        start_lon: float,
+        end_lat: float,
+        end_lon: float,
+        optimize_for: str
+    ) -> RouteCacheKey:
+        """
+        Snap coordinates to a ~100m grid so near-identical requests share an entry;
+        the graph generation drops entries whenever the graph is reloaded
+        """
+        return (graph_service.generation,
+                round(start_lat * 1000), round(start_lon * 1000),
+                round(end_lat * 1000), round(end_lon * 1000), optimize_for)
+
+    async def find_routes_by_stops(
         self,
         start_stop_id: str,
-        end_stop_id: str,
+        end_stop_ids: List[str],
         optimize_for: str = "time"
-    ) -> Optional[OptimizedRoute]:
+    ) -> Dict[str, Optional[OptimizedRoute]]:
         """
-        Find optimal route between two specific stops
+        Find optimal routes from one stop to each of several, sharing one search
         """
-        if not graph_service.stops_cache:
-            await graph_service.load_graph_data()
+        await graph_service.wait_until_ready()
 
-        if start_stop_id not in graph_service.stops_cache or end_stop_id not in graph_service.stops_cache:
-            return None
+        if start_stop_id not in graph_service.stops_cache:
+            return {end_stop_id: None for end_stop_id in end_stop_ids}
 
-        route = await graph_service._dijkstra_with_transfers(start_stop_id, end_stop_id, optimize_for)
-        return route
+        known = [end_stop_id for end_stop_id in end_stop_ids if end_stop_id in graph_service.stops_cache]
+        routes = await graph_service.find_routes_from_stop(start_stop_id, known, optimize_for)
+        return {end_stop_id: routes.get(end_stop_id) for end_stop_id in end_stop_ids}
+
+    async def submit(
+        self,
+        start_stop_id: str,
+        end_stop_id: str,
+        optimize_for: str = "time"
+    ) -> Optional[OptimizedRoute]:
+        """
+        Queue a stop-to-stop request for the micro-batcher and wait for its route
+        """
+        loop = asyncio.get_running_loop()
+        if self._batch_loop is not loop or self._batch_worker is None or self._batch_worker.done():
+            if self._batch_loop is loop and self._batch_queue is not None:
+                # Requests queued behind a worker that died would otherwise wait forever
+                self._fail_queued(self._batch_queue)
+            self._batch_queue = asyncio.Queue()
+            self._batch_loop = loop
+            self._batch_worker = loop.create_task(self._run_batches(self._batch_queue))
+
+        future = loop.create_future()
+        self._batch_queue.put_nowait(((start_stop_id, end_stop_id, optimize_for), future))
+        return await future
+
+    async def _run_batches(self, queue: asyncio.Queue):
+        """
+        Drain whatever requests queued up while the previous batch was running.
+        A lone request is served immediately; under load batches grow on their own.
+        """
+        try:
+            while True:
+                batch = [await queue.get()]
+                while len(batch) < BATCH_MAX_SIZE and not queue.empty():
+                    batch.append(queue.get_nowait())
+                try:
+                    await self._process_batch(batch)
+                finally:
+                    # Only a batch cut short (e.g. by cancellation) has futures left unresolved
+                    self._fail_pending(future for _, future in batch)
+        finally:
+            self._fail_queued(queue)
+
+    @staticmethod
+    def _fail_pending(futures):
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError("Route batch was interrupted"))
+
+    @classmethod
+    def _fail_queued(cls, queue: asyncio.Queue):
+        """Fail every request still waiting in a queue whose worker has stopped"""
+        while not queue.empty():
+            _, future = queue.get_nowait()
+            cls._fail_pending([future])
+
+    async def _process_batch(self, batch: List[Tuple[StopRouteKey, asyncio.Future]]):
+        """
+        Answer every destination requested from the same origin and criteria with one
+        search, and fan each result out to every waiter for it
+        """
+        waiters: Dict[StopRouteKey, List[asyncio.Future]] = {}
+        for key, future in batch:
+            waiters.setdefault(key, []).append(future)
+
+        # (optimize_for, start stop) -> distinct end stops
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for start_stop_id, end_stop_id, optimize_for in waiters:
+            groups.setdefault((optimize_for, start_stop_id), []).append(end_stop_id)
+
+        if len(batch) > 1:
+            logger.debug(f"Route batch: {len(batch)} requests, {len(waiters)} distinct, "
+                         f"{len(groups)} searches")
+
+        for (optimize_for, start_stop_id), end_stop_ids in groups.items():
+            try:
+                routes = await self.find_routes_by_stops(start_stop_id, end_stop_ids, optimize_for)
+            except Exception as e:
+                for end_stop_id in end_stop_ids:
+                    for future in waiters[(start_stop_id, end_stop_id, optimize_for)]:
+                        if not future.done():
+                            future.set_exception(e)
+                continue
+
+            for end_stop_id, route in routes.items():
+                for future in waiters[(start_stop_id, end_stop_id, optimize_for)]:
+                    if not future.done():
+                        future.set_result(route)
 
     async def get_stop_suggestions(self, query: str, limit: int = 10) -> List[Dict]:
         """
         Get stop suggestions for autocomplete
         """
+        # The graph generation in the key drops entries whenever the graph is reloaded
+        query = query.strip()
+        cache_key = (graph_service.generation, query.lower(), limit)
+        suggestions = self._suggestion_cache.get(cache_key)
+        if suggestions is None:
+            ready = graph_service.is_ready()
+            suggestions = await self._find_stop_suggestions(query, limit)
+            # Database fallback answers would outlive the load they stand in for
+            if ready:
+                self._suggestion_cache[cache_key] = suggestions
+        return suggestions
+
+    async def _find_stop_suggestions(self, query: str, limit: int) -> List[Dict]:
+        """
+        Match stops by name, in memory when possible
+        """
+        # Match against the in-memory graph off the event loop; the database
+        # is only queried while graph data is still loading
+        if graph_service.is_ready():
+            return await run_in_threadpool(graph_service.search_stops, query, limit)
+
         db = await get_database()
 
         # Case-insensitive regex search
@@ -12,13 +12,16 @@ echo "Installing FastAPI..."
 pip install --no-cache-dir fastapi
 
 echo "Installing Uvicorn..."
-pip install --no-cache-dir "uvicorn[standard]"
+pip install --no-cache-dir "uvicorn[standard]" uvloop httptools
 
 echo "Installing MongoDB drivers..."
 pip install --no-cache-dir motor pymongo
 
 echo "Installing other dependencies..."
-pip install --no-cache-dir pydantic python-multipart geopy
+pip install --no-cache-dir pydantic python-multipart
+
+echo "Installing performance dependencies..."
+pip install --no-cache-dir numpy orjson cachetools scipy numba
 
 # Verify critical imports
 python -c "
@@ -27,7 +30,13 @@ import uvicorn
 import motor
 import pymongo
 import pydantic
-import geopy
+import numpy
+import scipy
+import numba
+import orjson
+import cachetools
+import uvloop
+import httptools
 print('✅ All dependencies installed successfully!')
 print(f'Python version: {__import__(\"sys\").version}')
 print(f'FastAPI version: {fastapi.__version__}')
@@ -17,7 +17,8 @@ async def main():
     
     # Load graph data
     print("1. Loading graph data...")
-    await graph_service.load_graph_data()
+    # Reuses an already-loaded graph instead of fetching it again
+    await graph_service.wait_until_ready()
     print(f"   OK: Loaded {len(graph_service.stops_cache)} stops and {len(graph_service.routes_cache)} routes")
     
     # Test the original failing case
@@ -23,16 +23,18 @@ async def load_data_to_atlas():
     mongodb_url = os.getenv('MONGODB_URL')
     if not mongodb_url:
         print("MongoDB Atlas connection string not found in environment.")
-        mongodb_url = input("Enter your MongoDB Atlas connection string: ")
+        mongodb_url = await asyncio.to_thread(input, "Enter your MongoDB Atlas connection string: ")
     
     database_name = os.getenv('DATABASE_NAME', 'smartroute')
     
     print(f"Connecting to MongoDB Atlas...")
     print(f"Database: {database_name}")
     
+    client = None
     try:
-        # Connect to MongoDB Atlas
-        client = AsyncIOMotorClient(mongodb_url, serverSelectionTimeoutMS=30000)
+        # Connect to MongoDB Atlas; zlib wire compression shrinks the bulk upload
+        client = AsyncIOMotorClient(mongodb_url, compressors="zlib", zlibCompressionLevel=6,
+                                    serverSelectionTimeoutMS=30000)
         db = client[database_name]
         
         # Test connection
@@ -45,7 +47,7 @@ async def load_data_to_atlas():
         
         if stops_count > 0 or routes_count > 0:
             print(f"Database already contains data: {stops_count} stops, {routes_count} routes")
-            overwrite = input("Overwrite existing data? (y/N): ").lower().strip()
+            overwrite = (await asyncio.to_thread(input, "Overwrite existing data? (y/N): ")).lower().strip()
             if overwrite != 'y':
                 print("Aborted.")
                 return
@@ -92,7 +94,8 @@ DATABASE_NAME={database_name}
         logger.error(f"Failed to load data: {e}")
         raise
     finally:
-        client.close()
+        if client is not None:
+            client.close()
 
 if __name__ == "__main__":
     # Example usage:
@@ -2,22 +2,41 @@
 Development environment setup script
 """
 import subprocess
+import shutil
 import sys
 import os
 import venv
 
+MONGO_IMAGE = "mongo:7.0"
 
-def run_command(command, description):
-    """Run a shell command and handle errors"""
+
+def start_command(command, description):
+    """Start a command (an argument list, no shell) without waiting for it"""
     print(f"\n🔄 {description}...")
     try:
-        result = subprocess.run(command, shell=True,
-                                check=True, capture_output=True, text=True)
-        print(f"✅ {description} completed successfully")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ {description} failed: {e.stderr}")
+        # Only stderr is reported, so stdout is discarded rather than left to fill a pipe
+        return subprocess.Popen(command, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True)
+    except OSError as e:
+        return e
+
+
+def wait_command(process, description):
+    """Wait for a started command and report how it went"""
+    if isinstance(process, OSError):
+        print(f"❌ {description} failed: {process}")
+        return False
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        print(f"❌ {description} failed: {stderr}")
         return False
+    print(f"✅ {description} completed successfully")
+    return True
+
+
+def run_command(command, description):
+    """Run a command and handle errors"""
+    return wait_command(start_command(command, description), description)
 
 
 def setup_virtual_environment():
@@ -41,7 +60,7 @@ def setup_virtual_environment():
 
     # Install requirements
     if os.path.exists("requirements.txt"):
-        if run_command(f"{pip_path} install -r requirements.txt", "Installing Python dependencies"):
+        if run_command([pip_path, "install", "-r", "requirements.txt"], "Installing Python dependencies"):
             print("✅ Dependencies installed successfully")
         else:
             print("❌ Failed to install dependencies")
@@ -50,18 +69,24 @@ def setup_virtual_environment():
     return activate_script
 
 
-def setup_mongodb():
-    """Set up MongoDB for development"""
+def choose_mongodb_setup():
+    """Ask how MongoDB should be set up"""
     print("\n🗃️  MongoDB Setup Options:")
     print("1. Use Docker (recommended)")
     print("2. Use local MongoDB installation")
     print("3. Skip MongoDB setup")
 
-    choice = input("\nSelect option (1-3): ").strip()
+    return input("\nSelect option (1-3): ").strip()
 
+
+def setup_mongodb(choice, image_pull=None):
+    """Set up MongoDB for development, after image_pull (if started) finishes"""
     if choice == "1":
-        if run_command("docker --version", "Checking Docker"):
-            if run_command("docker run -d -p 27017:27017 --name smartroute_mongo mongo:7.0", "Starting MongoDB container"):
+        if image_pull is not None:
+            wait_command(image_pull, "Pulling MongoDB image")
+        if run_command(["docker", "--version"], "Checking Docker"):
+            if run_command(["docker", "run", "-d", "-p", "27017:27017", "--name", "smartroute_mongo", MONGO_IMAGE],
+                           "Starting MongoDB container"):
                 print("✅ MongoDB container started on port 27017")
                 return True
             else:
@@ -91,6 +116,12 @@ def main():
         print(
             f"✅ Python {sys.version_info.major}.{sys.version_info.minor} detected")
 
+    # Download the MongoDB image while dependencies install; both are network-bound
+    mongodb_choice = choose_mongodb_setup()
+    image_pull = None
+    if mongodb_choice == "1" and shutil.which("docker"):
+        image_pull = start_command(["docker", "pull", MONGO_IMAGE], "Pulling MongoDB image")
+
     # Set up virtual environment
     activate_script = setup_virtual_environment()
     if not activate_script:
@@ -99,7 +130,8 @@ def main():
     # Set up environment file
     if not os.path.exists(".env"):
         if os.path.exists(".env.example"):
-            run_command("cp .env.example .env", "Creating environment file")
+            shutil.copy(".env.example", ".env")
+            print("✅ Environment file created")
         else:
             print("⚠️  Creating basic .env file")
             with open(".env", "w") as f:
@@ -107,7 +139,7 @@ def main():
                 f.write("DATABASE_NAME=smartroute\n")
 
     # Set up MongoDB
-    setup_mongodb()
+    setup_mongodb(mongodb_choice, image_pull)
 
     # Create data directories
     os.makedirs("data/gtfs", exist_ok=True)
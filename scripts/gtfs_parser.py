@@ -1,19 +1,65 @@
 """
 GTFS (General Transit Feed Specification) parser
 """
+import numpy as np
 import pandas as pd
 import os
 import asyncio
 import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, WriteConcern
 from app.config import settings
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columns read from each required GTFS file; optional ones may be absent
+GTFS_COLUMNS = {
+    'stops.txt': {'stop_id', 'stop_name', 'stop_lat', 'stop_lon'},
+    'routes.txt': {'route_id', 'route_short_name', 'route_type'},
+    'stop_times.txt': {'trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'},
+    'trips.txt': {'trip_id', 'route_id'},
+}
+
+# Documents per insert_many call and calls in flight at once
+INSERT_BATCH_SIZE = 10_000
+INSERT_CONCURRENCY = 8
+
+
+async def _write_in_batches(write, documents: list):
+    """Pass documents to write in batches, a few concurrently, to stay under MongoDB's batch limits"""
+    semaphore = asyncio.Semaphore(INSERT_CONCURRENCY)
+    
+    async def write_batch(batch):
+        async with semaphore:
+            await write(batch)
+    
+    await asyncio.gather(*(
+        write_batch(documents[i:i + INSERT_BATCH_SIZE])
+        for i in range(0, len(documents), INSERT_BATCH_SIZE)
+    ))
+
+
+async def insert_in_batches(collection, documents: list):
+    """Insert documents in unordered batches"""
+    await _write_in_batches(lambda batch: collection.insert_many(batch, ordered=False), documents)
+
+
+async def upsert_in_batches(collection, documents: list, key: str):
+    """Replace documents matched on key, inserting new ones, then drop those no longer present"""
+    await _write_in_batches(
+        lambda batch: collection.bulk_write(
+            [ReplaceOne({key: doc[key]}, doc, upsert=True) for doc in batch], ordered=False),
+        documents
+    )
+    await collection.delete_many({key: {"$nin": [doc[key] for doc in documents]}})
+
 class GTFSParser:
     def __init__(self, gtfs_path: str):
         self.gtfs_path = gtfs_path
@@ -21,15 +67,16 @@ class GTFSParser:
         self.routes_df = None
         self.stop_times_df = None
         self.trips_df = None
+        self._route_type_map = {}
     
     def load_gtfs_files(self):
         """Load GTFS files into pandas DataFrames"""
         try:
-            # Required files
-            self.stops_df = pd.read_csv(os.path.join(self.gtfs_path, 'stops.txt'))
-            self.routes_df = pd.read_csv(os.path.join(self.gtfs_path, 'routes.txt'))
-            self.stop_times_df = pd.read_csv(os.path.join(self.gtfs_path, 'stop_times.txt'))
-            self.trips_df = pd.read_csv(os.path.join(self.gtfs_path, 'trips.txt'))
+            # Required files are independent, so they are parsed concurrently
+            with ThreadPoolExecutor(max_workers=len(GTFS_COLUMNS)) as pool:
+                self.stops_df, self.routes_df, self.stop_times_df, self.trips_df = pool.map(
+                    self._read_gtfs_file, GTFS_COLUMNS)
+            self._route_type_map = self._build_route_type_map(self.routes_df)
             
             logger.info(f"Loaded GTFS files:")
             logger.info(f"  - Stops: {len(self.stops_df)}")
@@ -41,6 +88,11 @@ class GTFSParser:
             logger.error(f"Error loading GTFS files: {e}")
             raise
     
+    def _read_gtfs_file(self, filename: str) -> pd.DataFrame:
+        """Read one GTFS file, skipping columns the parser never uses"""
+        columns = GTFS_COLUMNS[filename]
+        return pd.read_csv(os.path.join(self.gtfs_path, filename), usecols=lambda column: column in columns)
+    
     def process_data(self):
         """Process GTFS data and create connections"""
         # Merge data to get route information for each trip
@@ -52,73 +104,79 @@ class GTFSParser:
         # Sort by trip and stop sequence
         merged_df = merged_df.sort_values(['trip_id', 'stop_sequence'])
         
+        # Each row and the next one in the same trip form a connection
+        trip_ids = merged_df['trip_id'].to_numpy()
+        same_trip = trip_ids[:-1] == trip_ids[1:]
+        current_stops = merged_df.iloc[:-1][same_trip]
+        next_stops = merged_df.iloc[1:][same_trip]
+        
+        # Calculate travel times (simplified) for every connection at once
+        time_diffs = self._calculate_time_diffs(
+            self._times_to_minutes(current_stops, 'departure_time'),
+            self._times_to_minutes(next_stops, 'arrival_time')
+        )
+        
+        # Few distinct (route type, time) pairs occur, so each cost is computed once
+        estimate_cost = lru_cache(maxsize=None)(self._estimate_cost)
+        
         # Create connections between consecutive stops
-        connections = {}
+        connections = defaultdict(list)
         
-        for trip_id, trip_group in merged_df.groupby('trip_id'):
-            trip_stops = trip_group.sort_values('stop_sequence')
-            route_id = trip_stops.iloc[0]['route_id']
-            
-            for i in range(len(trip_stops) - 1):
-                current_stop = trip_stops.iloc[i]
-                next_stop = trip_stops.iloc[i + 1]
-                
-                from_stop_id = str(current_stop['stop_id'])
-                to_stop_id = str(next_stop['stop_id'])
-                
-                # Calculate travel time (simplified)
-                time_diff = self._calculate_time_diff(
-                    current_stop.get('departure_time', '00:00:00'),
-                    next_stop.get('arrival_time', '00:00:00')
-                )
-                
-                if from_stop_id not in connections:
-                    connections[from_stop_id] = []
-                
-                # Estimate cost based on route type
-                route_type = self._get_route_type(route_id)
-                estimated_cost = self._estimate_cost(route_type, time_diff)
-                
-                connections[from_stop_id].append({
-                    "to_stop_id": to_stop_id,
-                    "route_id": str(route_id),
-                    "time": max(1, time_diff),  # Minimum 1 minute
-                    "cost": estimated_cost,
-                    "sequence": int(current_stop['stop_sequence'])
-                })
+        for from_stop_id, to_stop_id, route_id, sequence, time_diff in zip(
+            current_stops['stop_id'].tolist(),
+            next_stops['stop_id'].tolist(),
+            current_stops['route_id'].tolist(),
+            current_stops['stop_sequence'].tolist(),
+            time_diffs.tolist()
+        ):
+            connections[str(from_stop_id)].append({
+                "to_stop_id": str(to_stop_id),
+                "route_id": str(route_id),
+                "time": time_diff,
+                "cost": estimate_cost(self._get_route_type(route_id), time_diff),
+                "sequence": int(sequence)
+            })
         
-        return connections
+        return dict(connections)
     
-    def _calculate_time_diff(self, departure_time: str, arrival_time: str) -> int:
-        """Calculate time difference in minutes"""
-        try:
-            def time_to_minutes(time_str):
-                if pd.isna(time_str):
-                    return 0
-                parts = str(time_str).split(':')
-                return int(parts[0]) * 60 + int(parts[1])
-            
-            dep_minutes = time_to_minutes(departure_time)
-            arr_minutes = time_to_minutes(arrival_time)
-            
-            diff = arr_minutes - dep_minutes
-            if diff < 0:  # Handle day overflow
-                diff += 24 * 60
-            
-            return max(1, diff)  # Minimum 1 minute
-            
-        except:
-            return 5  # Default to 5 minutes
+    @staticmethod
+    def _times_to_minutes(stop_times: pd.DataFrame, column: str) -> np.ndarray:
+        """Minutes past midnight for an HH:MM:SS column; missing times are 0, malformed ones NaN"""
+        if column not in stop_times:
+            return np.zeros(len(stop_times))
+        times = stop_times[column]
+        parts = times.where(times.notna(), '0:0').astype(str).str.split(':', expand=True)
+        if parts.shape[1] < 2:
+            return np.full(len(stop_times), np.nan)
+        hours = pd.to_numeric(parts[0], errors='coerce')
+        minutes = pd.to_numeric(parts[1], errors='coerce')
+        return (hours * 60 + minutes).to_numpy(dtype=float)
+    
+    @staticmethod
+    def _calculate_time_diffs(departures: np.ndarray, arrivals: np.ndarray) -> np.ndarray:
+        """Calculate time differences in minutes"""
+        diffs = arrivals - departures
+        diffs = np.where(diffs < 0, diffs + 24 * 60, diffs)  # Handle day overflow
+        diffs = np.maximum(diffs, 1)  # Minimum 1 minute
+        # Default to 5 minutes when either time can't be parsed
+        return np.where(np.isnan(diffs), 5, diffs).astype(int)
+    
+    @staticmethod
+    def _build_route_type_map(routes_df: pd.DataFrame) -> dict:
+        """Map each route_id to its route type name, once per load"""
+        routes_df = routes_df.drop_duplicates('route_id')  # First entry wins, as before
+        if 'route_type' not in routes_df:
+            return {str(route_id): 'bus' for route_id in routes_df['route_id']}
+        # GTFS route types: 0=Tram, 1=Metro, 2=Rail, 3=Bus, etc.
+        type_mapping = {0: 'tram', 1: 'metro', 2: 'rail', 3: 'bus'}
+        return {
+            str(route_id): type_mapping.get(route_type, 'bus')
+            for route_id, route_type in zip(routes_df['route_id'], routes_df['route_type'])
+        }
     
     def _get_route_type(self, route_id: str) -> str:
-        """Get route type from routes dataframe"""
-        route_info = self.routes_df[self.routes_df['route_id'] == route_id]
-        if not route_info.empty:
-            route_type = route_info.iloc[0].get('route_type', 3)
-            # GTFS route types: 0=Tram, 1=Metro, 2=Rail, 3=Bus, etc.
-            type_mapping = {0: 'tram', 1: 'metro', 2: 'rail', 3: 'bus'}
-            return type_mapping.get(route_type, 'bus')
-        return 'bus'
+        """Get route type from the map built when routes.txt was loaded"""
+        return self._route_type_map.get(str(route_id), 'bus')
     
     def _estimate_cost(self, route_type: str, time_minutes: int) -> float:
         """Estimate cost based on route type and time"""
@@ -134,67 +192,96 @@ class GTFSParser:
         time_cost = (time_minutes / 10) * 0.5
         return round(base_cost + time_cost, 2)
     
+    def _prepare_documents(self, connections: dict) -> tuple:
+        """Build the stop and route documents to insert"""
+        # Prepare stops data
+        stops_to_insert = [
+            {
+                "stop_id": str(stop['stop_id']),
+                "name": str(stop['stop_name']),
+                "location": {
+                    "type": "Point",
+                    "coordinates": [float(stop['stop_lon']), float(stop['stop_lat'])]
+                },
+                "connections": connections.get(str(stop['stop_id']), [])
+            }
+            for stop in self.stops_df[['stop_id', 'stop_name', 'stop_lon', 'stop_lat']].to_dict(orient='records')
+        ]
+        
+        # Get stops for each route from its first trip (assuming similar stop patterns)
+        first_trips = self.trips_df.drop_duplicates('route_id').set_index('route_id')['trip_id'].to_dict()
+        first_trip_stops = (
+            self.stop_times_df[self.stop_times_df['trip_id'].isin(list(first_trips.values()))]
+            .sort_values('stop_sequence', kind='stable')
+            .groupby('trip_id')['stop_id']
+            .agg(list)
+            .to_dict()
+        )
+        
+        # Prepare routes data
+        routes_to_insert = [
+            {
+                "route_id": str(route['route_id']),
+                "name": str(route['route_short_name']),
+                "stops": [str(stop_id) for stop_id in first_trip_stops.get(first_trips[route['route_id']], [])],
+                "route_type": self._get_route_type(route['route_id'])
+            }
+            for route in self.routes_df.to_dict(orient='records')
+            if route['route_id'] in first_trips
+        ]
+        
+        return stops_to_insert, routes_to_insert
+    
     async def load_to_database(self):
         """Load processed data to MongoDB"""
-        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        # zlib wire compression shrinks the bulk upload of connection lists
+        client = AsyncIOMotorClient(settings.MONGODB_URL, compressors="zlib", zlibCompressionLevel=6)
         db = client[settings.DATABASE_NAME]
         
         try:
             # Process connections
             connections = self.process_data()
             
-            # Prepare stops data
-            stops_to_insert = []
-            for _, stop in self.stops_df.iterrows():
-                stop_doc = {
-                    "stop_id": str(stop['stop_id']),
-                    "name": str(stop['stop_name']),
-                    "location": {
-                        "type": "Point",
-                        "coordinates": [float(stop['stop_lon']), float(stop['stop_lat'])]
-                    },
-                    "connections": connections.get(str(stop['stop_id']), [])
-                }
-                stops_to_insert.append(stop_doc)
+            stops_to_insert, routes_to_insert = self._prepare_documents(connections)
             
-            # Prepare routes data
-            routes_to_insert = []
-            for _, route in self.routes_df.iterrows():
-                # Get stops for this route
-                route_trips = self.trips_df[self.trips_df['route_id'] == route['route_id']]
-                if not route_trips.empty:
-                    # Get stops from first trip (assuming similar stop patterns)
-                    first_trip = route_trips.iloc[0]['trip_id']
-                    trip_stops = self.stop_times_df[
-                        self.stop_times_df['trip_id'] == first_trip
-                    ].sort_values('stop_sequence')
-                    
-                    route_doc = {
-                        "route_id": str(route['route_id']),
-                        "name": str(route['route_short_name']),
-                        "stops": [str(stop_id) for stop_id in trip_stops['stop_id'].tolist()],
-                        "route_type": self._get_route_type(route['route_id'])
-                    }
-                    routes_to_insert.append(route_doc)
+            if settings.INCREMENTAL_LOAD:
+                # Rewrite documents in place so a reload doesn't churn the whole collection
+                await db.stops.create_index("stop_id", unique=True)
+                await db.routes.create_index("route_id", unique=True)
+                await upsert_in_batches(db.stops, stops_to_insert, "stop_id")
+                await upsert_in_batches(db.routes, routes_to_insert, "route_id")
+                await db.stops.create_index([("location", "2dsphere")])
+                logger.info(f"Upserted {len(stops_to_insert)} stops and {len(routes_to_insert)} routes")
+                return
             
             # Clear existing data
             await db.stops.delete_many({})
             await db.routes.delete_many({})
             logger.info("Cleared existing data")
             
-            # Insert new data
+            # Unique indexes catch duplicate ids as documents arrive rather than in a second pass
+            await db.stops.create_index("stop_id", unique=True)
+            await db.routes.create_index("route_id", unique=True)
+            
+            # Insert new data with primary-only acks, then confirm the counts once at the end
+            bulk_concern = WriteConcern(w=1)
             if stops_to_insert:
-                await db.stops.insert_many(stops_to_insert)
+                await insert_in_batches(db.stops.with_options(write_concern=bulk_concern), stops_to_insert)
                 logger.info(f"Inserted {len(stops_to_insert)} stops")
             
             if routes_to_insert:
-                await db.routes.insert_many(routes_to_insert)
+                await insert_in_batches(db.routes.with_options(write_concern=bulk_concern), routes_to_insert)
                 logger.info(f"Inserted {len(routes_to_insert)} routes")
             
-            # Create indexes
+            stops_count = await db.stops.count_documents({})
+            routes_count = await db.routes.count_documents({})
+            if (stops_count, routes_count) != (len(stops_to_insert), len(routes_to_insert)):
+                raise RuntimeError(
+                    f"Expected {len(stops_to_insert)} stops and {len(routes_to_insert)} routes, "
+                    f"found {stops_count} and {routes_count}")
+            
+            # The geo index is built once over the populated collection
             await db.stops.create_index([("location", "2dsphere")])
-            await db.stops.create_index("stop_id", unique=True)
-            await db.routes.create_index("route_id", unique=True)
             logger.info("Created indexes")
             
             logger.info("GTFS data loaded successfully!")
@@ -6,12 +6,15 @@ import asyncio
 import sys
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
-from geopy.distance import geodesic
-import random
+from pymongo import WriteConcern
+import numpy as np
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.config import settings
 
+# Mean Earth radius, as in app.services._geo; importing that package would load the whole API
+EARTH_RADIUS_KM = 6371.0
+
 
 # Comprehensive transit network inspired by Bangalore
 COMPREHENSIVE_STOPS = [
@@ -199,51 +202,54 @@ COMPREHENSIVE_ROUTES = [
 ]
 
 
-def calculate_realistic_time_and_cost(from_stop, to_stop, route_info, sequence):
-    """Calculate realistic travel time and cost based on distance and route type"""
-    
-    # Find stop coordinates
-    from_coords = None
-    to_coords = None
-    
-    for stop in COMPREHENSIVE_STOPS:
-        if stop["stop_id"] == from_stop:
-            from_coords = (stop["lat"], stop["lon"])
-        elif stop["stop_id"] == to_stop:
-            to_coords = (stop["lat"], stop["lon"])
-    
-    if not from_coords or not to_coords:
-        # Default values if coordinates not found
-        return 5, 2.0
+STOP_COORDS = {stop["stop_id"]: (stop["lat"], stop["lon"]) for stop in COMPREHENSIVE_STOPS}
+
+# Source of the time/cost variation; PCG64 fills a whole route's legs per call
+RNG = np.random.default_rng()
+
+
+def route_leg_distances_km(stops):
+    """Haversine distance of every leg along a route in one pass; NaN where a stop has no coordinates"""
+    coords = np.radians([STOP_COORDS.get(stop_id, (np.nan, np.nan)) for stop_id in stops])
+    lats, lons = coords[:, 0], coords[:, 1]
+    a = (np.sin(np.diff(lats) / 2) ** 2
+         + np.cos(lats[:-1]) * np.cos(lats[1:]) * np.sin(np.diff(lons) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def calculate_realistic_time_and_cost(distances_km, route_info):
+    """Calculate realistic travel time and cost of each leg based on distance and route type"""
     
-    # Calculate distance
-    distance_km = geodesic(from_coords, to_coords).kilometers
+    distances_km = np.asarray(distances_km)
+    known = ~np.isnan(distances_km)
+    distance_km = np.where(known, distances_km, 0.0)
     
     route_type = route_info["route_type"]
     
     if route_type == "metro":
         # Metro: faster, more expensive
         # Average speed: 35 km/h + 1 minute station stop
-        time = max(2, int((distance_km / 35) * 60) + 1)
-        cost = max(10, distance_km * 15)  # ₹15 per km base
+        time = np.maximum(2, ((distance_km / 35) * 60).astype(int) + 1)
+        cost = np.maximum(10, distance_km * 15)  # ₹15 per km base
         
     else:  # bus
         # Bus: slower due to traffic, cheaper
         # Average speed varies by route type
         if "Express" in route_info["name"] or "Shuttle" in route_info["name"]:
             # Express routes: 25 km/h average
-            time = max(3, int((distance_km / 25) * 60) + 1)
-            cost = max(5, distance_km * 8)  # ₹8 per km
+            time = np.maximum(3, ((distance_km / 25) * 60).astype(int) + 1)
+            cost = np.maximum(5, distance_km * 8)  # ₹8 per km
         else:
             # Local routes: 20 km/h average with more stops
-            time = max(4, int((distance_km / 20) * 60) + 2)
-            cost = max(5, distance_km * 6)  # ₹6 per km
+            time = np.maximum(4, ((distance_km / 20) * 60).astype(int) + 2)
+            cost = np.maximum(5, distance_km * 6)  # ₹6 per km
     
-    # Add some realistic variation
-    time_variation = random.randint(-1, 2)
-    cost_variation = random.uniform(-0.5, 1.0)
+    # Add some realistic variation, drawn for the whole route at once
+    time = np.maximum(1, time + RNG.integers(-1, 3, size=len(distance_km)))
+    cost = np.maximum(1.0, cost + RNG.uniform(-0.5, 1.0, size=len(distance_km)))
     
-    return max(1, time + time_variation), max(1.0, cost + cost_variation)
+    # Default values if coordinates not found
+    return np.where(known, time, 5), np.where(known, cost, 2.0)
 
 
 async def create_comprehensive_connections():
@@ -256,42 +262,33 @@ async def create_comprehensive_connections():
         
         print(f"Processing route {route_id} with {len(stops)} stops...")
         
+        # Legs are the same length in both directions, so measure them once
+        distances = route_leg_distances_km(stops)
+        forward_times, forward_costs = calculate_realistic_time_and_cost(distances, route)
+        reverse_times, reverse_costs = calculate_realistic_time_and_cost(distances[::-1], route)
+        # Add slight variation for reverse direction
+        reverse_times += RNG.integers(0, 2, size=len(distances))
+        
         # Forward direction
-        for i in range(len(stops) - 1):
-            from_stop = stops[i]
-            to_stop = stops[i + 1]
-            
-            if from_stop not in connections:
-                connections[from_stop] = []
-            
-            time, cost = calculate_realistic_time_and_cost(from_stop, to_stop, route, i + 1)
-            
-            connections[from_stop].append({
+        for sequence, (from_stop, to_stop, time, cost) in enumerate(
+                zip(stops[:-1], stops[1:], forward_times.tolist(), forward_costs.tolist()), start=1):
+            connections.setdefault(from_stop, []).append({
                 "to_stop_id": to_stop,
                 "route_id": route_id,
                 "time": time,
                 "cost": cost,
-                "sequence": i + 1
+                "sequence": sequence
             })
         
         # Reverse direction (slightly different timing due to traffic patterns)
-        for i in range(len(stops) - 1, 0, -1):
-            from_stop = stops[i]
-            to_stop = stops[i - 1]
-            
-            if from_stop not in connections:
-                connections[from_stop] = []
-            
-            time, cost = calculate_realistic_time_and_cost(from_stop, to_stop, route, len(stops) - i)
-            # Add slight variation for reverse direction
-            time += random.randint(0, 1)
-            
-            connections[from_stop].append({
+        for sequence, (from_stop, to_stop, time, cost) in enumerate(
+                zip(stops[:0:-1], stops[-2::-1], reverse_times.tolist(), reverse_costs.tolist()), start=1):
+            connections.setdefault(from_stop, []).append({
                 "to_stop_id": to_stop,
                 "route_id": route_id,
                 "time": time,
                 "cost": cost,
-                "sequence": len(stops) - i
+                "sequence": sequence
             })
     
     print(f"Created connections for {len(connections)} stops")
@@ -314,6 +311,12 @@ async def load_comprehensive_data(db=None):
         await db.routes.delete_many({})
         print("Cleared existing data")
         
+        # Unique indexes catch duplicate ids as documents arrive rather than in a second pass
+        await asyncio.gather(
+            db.stops.create_index("stop_id", unique=True),
+            db.routes.create_index("route_id", unique=True),
+        )
+        
         print("Creating route connections...")
         connections = await create_comprehensive_connections()
         
@@ -332,18 +335,20 @@ async def load_comprehensive_data(db=None):
             }
             stops_to_insert.append(stop_doc)
         
-        await db.stops.insert_many(stops_to_insert)
+        # Unordered, primary-acknowledged inserts; the data is reloaded from this script anyway
+        await db.stops.with_options(write_concern=WriteConcern(w=1)).insert_many(stops_to_insert, ordered=False)
         print(f"Inserted {len(stops_to_insert)} stops")
         
         print("Inserting routes...")
-        await db.routes.insert_many(COMPREHENSIVE_ROUTES)
+        await db.routes.with_options(write_concern=WriteConcern(w=1)).insert_many(COMPREHENSIVE_ROUTES, ordered=False)
         print(f"Inserted {len(COMPREHENSIVE_ROUTES)} routes")
         
         print("Creating database indexes...")
-        await db.stops.create_index([("location", "2dsphere")])
-        await db.stops.create_index("stop_id", unique=True)
-        await db.routes.create_index("route_id", unique=True)
-        await db.stops.create_index("zone")
+        # Secondary indexes are built once over the populated collection
+        await asyncio.gather(
+            db.stops.create_index([("location", "2dsphere")]),
+            db.stops.create_index("zone"),
+        )
         print("Created indexes")
         
         # Print statistics
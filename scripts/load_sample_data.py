@@ -3,6 +3,7 @@ Load sample transport data for testing
 """
 from app.config import settings
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
 import asyncio
 import sys
 import os
@@ -108,6 +109,12 @@ async def load_sample_data():
         await db.routes.delete_many({})
         print("Cleared existing data")
 
+        # Unique indexes catch duplicate ids as documents arrive rather than in a second pass
+        await asyncio.gather(
+            db.stops.create_index("stop_id", unique=True),
+            db.routes.create_index("route_id", unique=True),
+        )
+
         # Create connections
         connections = await create_connections()
 
@@ -125,17 +132,16 @@ async def load_sample_data():
             }
             stops_to_insert.append(stop_doc)
 
-        await db.stops.insert_many(stops_to_insert)
+        # Unordered, primary-acknowledged inserts; the data is reloaded from this script anyway
+        await db.stops.with_options(write_concern=WriteConcern(w=1)).insert_many(stops_to_insert, ordered=False)
         print(f"Inserted {len(stops_to_insert)} stops")
 
         # Insert routes
-        await db.routes.insert_many(SAMPLE_ROUTES)
+        await db.routes.with_options(write_concern=WriteConcern(w=1)).insert_many(SAMPLE_ROUTES, ordered=False)
         print(f"Inserted {len(SAMPLE_ROUTES)} routes")
 
         # Create indexes
         await db.stops.create_index([("location", "2dsphere")])
-        await db.stops.create_index("stop_id", unique=True)
-        await db.routes.create_index("route_id", unique=True)
         print("Created indexes")
  
         print("Sample data loaded successfully!")
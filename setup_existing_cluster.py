@@ -108,10 +108,12 @@ async def setup_existing_cluster():
         
         # Create indexes
         logger.info("Creating database indexes...")
-        await db[stops_collection].create_index([("location", "2dsphere")])
-        await db[stops_collection].create_index("stop_id", unique=True)
-        await db[routes_collection].create_index("route_id", unique=True)
-        await db[stops_collection].create_index("name")
+        await asyncio.gather(
+            db[stops_collection].create_index([("location", "2dsphere")]),
+            db[stops_collection].create_index("stop_id", unique=True),
+            db[routes_collection].create_index("route_id", unique=True),
+            db[stops_collection].create_index("name"),
+        )
         logger.info("✓ Indexes created")
         
         # Show environment variables for deployment
@@ -1,4 +1,5 @@
 #!/usr/bin/env bash
 # Start the FastAPI application with uvicorn
 PORT=${PORT:-8000}
-uvicorn app.main:app --host 0.0.0.0 --port $PORT --log-level info
\ No newline at end of file
+WEB_CONCURRENCY=${WEB_CONCURRENCY:-1}
+uvicorn app.main:app --host 0.0.0.0 --port $PORT --loop uvloop --http httptools --workers $WEB_CONCURRENCY --log-level info
\ No newline at end of file
@@ -23,6 +23,25 @@ class TestAPI:
         })
         assert response.status_code == 422  # Validation error
 
+    def test_find_route_out_of_range_coordinates(self):
+        """Test route finding rejects out-of-range coordinates"""
+        response = client.post("/api/v1/route", json={
+            "start": {"lat": 91.0, "lon": 77.5946},
+            "end": {"lat": 12.9833, "lon": 181.0},
+            "optimize_for": "time"
+        })
+        assert response.status_code == 422
+
+    def test_find_route_zero_coordinates(self):
+        """Test equator/prime-meridian coordinates pass validation"""
+        response = client.post("/api/v1/route", json={
+            "start": {"lat": 0.0, "lon": 0.0},
+            "end": {"lat": 0.0, "lon": 0.5},
+            "optimize_for": "time"
+        })
+        # 0.0 is a valid coordinate; outside the service area it's a 404, not a validation error
+        assert response.status_code not in (400, 422)
+
     def test_find_route_invalid_optimization(self):
         """Test route finding with invalid optimization parameter"""
         response = client.post("/api/v1/route", json={
@@ -58,6 +77,17 @@ class TestAPI:
         assert "nearby_stops" in data
         assert isinstance(data["nearby_stops"], list)
 
+    def test_graph_stats_while_loading(self):
+        """Test graph endpoints report 503 until network data is loaded"""
+        from app.services.graph_service import graph_service
+
+        if graph_service.stops_cache:
+            pytest.skip("Graph data already loaded")
+
+        response = client.get("/api/v1/graph/stats")
+        assert response.status_code == 503
+        assert "detail" in response.json()
+
     def test_root_endpoint(self):
         """Test root endpoint"""
         response = client.get("/")
@@ -80,19 +80,19 @@ class TestEnhancedSmartRouteAPI:
             {
                 "start": {"lat": 91.0, "lon": 77.5946},
                 "end": {"lat": 12.9759, "lon": 77.6081},
-                "expected_status": 400
+                "expected_status": 422
             },
             # Invalid longitude
             {
                 "start": {"lat": 12.9716, "lon": 181.0},
                 "end": {"lat": 12.9759, "lon": 77.6081},
-                "expected_status": 400
+                "expected_status": 422
             },
             # Missing coordinates
             {
                 "start": {"lat": 12.9716},
                 "end": {"lat": 12.9759, "lon": 77.6081},
-                "expected_status": 400
+                "expected_status": 422
             },
             # Coordinates too far from service area
             {
@@ -101,6 +101,40 @@ class TestGraphAlgorithms:
         assert len(nearest) <= 2
         assert "S1" in nearest
 
+    def test_nearest_stops_sorted_by_distance(self, mock_graph_service):
+        """Test nearest stops are ordered and limited to walking distance"""
+        # Point between Stop 2 and Stop 3 (~0.5km apart)
+        nearest = mock_graph_service.find_nearest_stops(12.9738, 77.6094, 5)
+        distances = [dist for _, dist in nearest]
+
+        assert [stop_id for stop_id, _ in nearest][:2] in (["S2", "S3"], ["S3", "S2"])
+        assert distances == sorted(distances)
+        assert all(dist <= 0.5 for dist in distances)
+        assert len(mock_graph_service.find_nearest_stops(12.9738, 77.6094, 1)) == 1
+
+    def test_validate_coordinates(self, mock_graph_service):
+        """Test coordinates are accepted only within the search radius of a stop"""
+        assert mock_graph_service.validate_coordinates(12.9716, 77.5946)
+        # ~46km north of Stop 4, inside the 50km radius
+        assert mock_graph_service.validate_coordinates(13.4, 77.6)
+        assert not mock_graph_service.validate_coordinates(13.6, 77.6)
+        assert not mock_graph_service.validate_coordinates(91.0, 77.6)
+        assert (13.4, 77.6) in mock_graph_service._valid_coords_cache
+
+        # Cached answers are dropped when the stops change
+        mock_graph_service._invalidate_derived_caches()
+        mock_graph_service._ensure_spatial_index()
+        assert len(mock_graph_service._valid_coords_cache) == 0
+
+    def test_search_stops(self, mock_graph_service):
+        """Test in-memory stop name search"""
+        suggestions = mock_graph_service.search_stops("stop", 2)
+
+        assert [s["stop_id"] for s in suggestions] == ["S1", "S2"]
+        assert suggestions[0]["latitude"] == 12.9716
+        assert mock_graph_service.search_stops("STOP 4")[0]["stop_id"] == "S4"
+        assert mock_graph_service.search_stops("missing") == []
+
     def test_walking_time_calculation(self, mock_graph_service):
         """Test walking time calculation between stops"""
         walking_time = mock_graph_service.calculate_walking_time("S1", "S2")
@@ -137,3 +171,283 @@ class TestGraphAlgorithms:
 
         assert route is not None
         # Should prefer route with fewer transfers over faster/cheaper routes
+
+    def test_dijkstra_pathfinding_on_adjacency(self, mock_graph_service):
+        """Test multi-hop pathfinding over the CSR adjacency arrays"""
+        route = mock_graph_service._dijkstra_pathfinding("S1", "S4", "time")
+
+        # S1 -> S3 -> S4 stays on R2: 2min boarding + 15 + 6
+        assert route.path == ["S1", "S3", "S4"]
+        assert route.total_time == 23
+        assert route.transfers == 0
+        assert [s.boarding_time for s in route.segments] == [2, 0]
+        assert mock_graph_service._indptr.tolist() == [0, 2, 4, 5, 5]
+
+        assert mock_graph_service._dijkstra_pathfinding("S4", "S1", "time") is None
+
+    def test_compiled_search_matches_python(self, mock_graph_service):
+        """Test the Numba kernel and the Python search find the same paths"""
+        from app.services._dijkstra import dijkstra_csr
+
+        if dijkstra_csr is None:
+            pytest.skip("Numba not installed")
+
+        mock_graph_service._ensure_adjacency()
+        for optimize_for in ("time", "cost", "transfers"):
+            for sources, targets in (({0: 0}, {3: 0}), ({1: 0}, {3: 0}), ({3: 0}, {0: 0}), ({0: 0, 1: 4}, {2: 1, 3: 0})):
+                assert mock_graph_service._dijkstra_compiled(sources, targets, optimize_for, 5) == \
+                    mock_graph_service._dijkstra_search(sources, targets, optimize_for, 5)
+
+    def test_shortest_path_tree_is_reused(self, mock_graph_service):
+        """Test paths read from a cached origin tree match a search to each destination"""
+        mock_graph_service._ensure_adjacency()
+        tree = mock_graph_service._shortest_path_tree(0, "time", 5)
+        assert mock_graph_service._shortest_path_tree(0, "time", 5) is tree
+        for end in range(4):
+            assert mock_graph_service._path_from_tree(tree, 0, end) == \
+                mock_graph_service._dijkstra_search({0: 0}, {end: 0}, "time", 5)
+
+    def test_tree_built_only_for_repeated_origins(self, mock_graph_service):
+        """Test a one-off query stops early and a second query from its origin builds the tree"""
+        first = mock_graph_service._dijkstra_pathfinding("S1", "S3", "time")
+        assert len(mock_graph_service._sssp_cache) == 0
+
+        second = mock_graph_service._dijkstra_pathfinding("S1", "S4", "time")
+        assert len(mock_graph_service._sssp_cache) == 1
+        assert first.path == ["S1", "S3"]
+        assert second.path == ["S1", "S3", "S4"]
+
+    def test_python_shortest_path_tree(self, mock_graph_service):
+        """Test the Python search builds the same origin tree as a search to each destination"""
+        mock_graph_service._ensure_adjacency()
+        for optimize_for in ("time", "cost", "transfers"):
+            for start in range(4):
+                tree = mock_graph_service._python_shortest_path_tree(start, optimize_for, 5)
+                for end in range(4):
+                    assert mock_graph_service._path_from_tree(tree, start, end) == \
+                        mock_graph_service._dijkstra_search({start: 0}, {end: 0}, optimize_for, 5)
+
+    @pytest.mark.asyncio
+    async def test_routes_from_stop_share_one_tree(self, mock_graph_service):
+        """Test one-to-many routes match the routes found one destination at a time"""
+        ends = ["S1", "S2", "S3", "S4"]
+        routes = await mock_graph_service.find_routes_from_stop("S1", ends, "time")
+
+        assert list(routes) == ends
+        for end in ends:
+            single = await mock_graph_service._dijkstra_with_transfers("S1", end, "time")
+            assert routes[end].path == single.path
+            assert routes[end].total_time == single.total_time
+        assert len(mock_graph_service._sssp_cache) == 1
+
+    def test_indexed_heap_decrease_key(self):
+        """Test the indexed heap keeps one entry per node and pops in priority order"""
+        from app.services._heap import IndexedDHeap
+
+        heap = IndexedDHeap(6)
+        for node, priority in ((0, 5), (1, 3), (2, 8), (3, 1), (4, 7)):
+            heap.push_or_decrease(node, priority)
+        heap.push_or_decrease(2, 2)
+        heap.push_or_decrease(1, 9)  # not a decrease, ignored
+
+        assert len(heap) == 5
+        assert [heap.pop_min() for _ in range(5)] == [(3, 1), (2, 2), (1, 3), (0, 5), (4, 7)]
+
+    def test_multi_source_search(self, mock_graph_service):
+        """Test one search seeded from several start stops picks the cheapest overall"""
+        mock_graph_service._ensure_adjacency()
+
+        # From Stop 2, R3 reaches Stop 4 in 2 + 12 minutes, beating 23 from Stop 1
+        path, edges, transfers, total_time, _ = mock_graph_service._search({0: 0, 1: 0}, {3: 0}, "time", 5)
+        assert path == [1, 3]
+        assert total_time == 14
+
+        # A long walk to Stop 2 makes starting from Stop 1 cheaper again
+        path, _, _, _, _ = mock_graph_service._search({0: 0, 1: 10}, {3: 0}, "time", 5)
+        assert path == [0, 2, 3]
+
+    def test_bidirectional_search(self, mock_graph_service):
+        """Test the meet-in-the-middle search agrees with the one-directional search"""
+        mock_graph_service._ensure_adjacency()
+
+        for optimize_for in ("time", "cost", "transfers"):
+            for start, end in ((0, 3), (1, 3), (0, 2), (3, 0)):
+                assert mock_graph_service._bidirectional_search(start, end, optimize_for, 5) == \
+                    mock_graph_service._dijkstra_search({start: 0}, {end: 0}, optimize_for, 5)
+
+        assert mock_graph_service._rindptr.tolist() == [0, 0, 1, 3, 5]
+
+    def test_route_serving_both_stops(self, mock_graph_service):
+        """Test single-route lookup from the in-memory route/stop index"""
+        mock_graph_service.routes_cache["R2"]["stops"] = ["S1", "S3", "S4"]
+
+        route = mock_graph_service._find_route_serving_both_stops("S1", "S4")
+        assert route.segments[0].route_id == "R2"
+        assert route.total_time == 2 * 3 + 2
+        assert mock_graph_service._find_route_serving_both_stops("S1", "S2") is None
+
+    @pytest.mark.asyncio
+    async def test_untyped_routes_are_buses_everywhere(self, mock_graph_service):
+        """Test a route without route_type is labelled the way the search charges it"""
+        mock_graph_service.routes_cache["R2"]["stops"] = ["S1", "S3", "S4"]
+        direct = await mock_graph_service._dijkstra_with_transfers("S1", "S2", "time")
+        same_route = mock_graph_service._find_route_serving_both_stops("S1", "S4")
+        mock_graph_service._ensure_adjacency()
+
+        assert mock_graph_service._route_types == ["bus"] * 3
+        assert direct.segments[0].route_type == "bus"
+        assert direct.segments[0].boarding_time == 2
+        assert same_route.segments[0].route_type == "bus"
+
+    def test_walk_only_route(self, mock_graph_service):
+        """Test a stop near both ends short-circuits only when transit can't beat walking"""
+        start_walks = {"S2": (2, 0.2), "S3": (4, 0.3)}
+        end_walks = {"S3": (3, 0.25), "S4": (1, 0.1)}
+
+        route = mock_graph_service._walk_only_route(start_walks, end_walks, "cost")
+        assert route.path == ["S3"]
+        assert route.total_time == route.walking_time == 7
+        assert (route.start_walking_time, route.end_walking_time) == (4, 3)
+
+        # 7 minutes of walking vs at least 2 + 1 + 2 boarding through the network
+        assert mock_graph_service._walk_only_route(start_walks, end_walks, "time") is None
+        assert mock_graph_service._walk_only_route({"S3": (1, 0.1)}, end_walks, "time").path == ["S3"]
+        assert mock_graph_service._walk_only_route({"S2": (1, 0.1)}, end_walks, "cost") is None
+
+    @pytest.mark.asyncio
+    async def test_walks_use_candidate_distances(self, mock_graph_service, monkeypatch):
+        """Test walks to candidate stops reuse the distances they were admitted by"""
+        mock_graph_service._ready.set()
+        nearest = {12.9716: [("S1", 0.5)], 12.9833: [("S4", 0.1)]}
+        monkeypatch.setattr(mock_graph_service, "find_nearest_stops",
+                            lambda lat, lon, limit: nearest[lat])
+
+        route = await mock_graph_service.find_optimal_route(12.9716, 77.5946, 12.9833, 77.6097)
+        assert (route.start_walking_time, route.end_walking_time) == (6, 1)
+        assert route.total_time == route.walking_time + 23
+
+    def test_mode_specific_penalties(self, mock_graph_service):
+        """Test boarding/transfer penalties resolved per route type"""
+        mock_graph_service.routes_cache["R1"]["route_type"] = "metro"
+
+        assert mock_graph_service.get_mode_specific_penalties("R1") == (1, 3)
+        assert mock_graph_service.get_mode_specific_penalties("R2") == (2, 3)
+        assert mock_graph_service.get_mode_specific_penalties("UNKNOWN") == (2, 3)
+
+    def test_failed_load_is_not_retried_immediately(self):
+        """Test an empty load doesn't send every following request back to the database"""
+        service = GraphService()
+        calls = []
+
+        async def empty_load():
+            calls.append(1)
+
+        service.load_graph_data = empty_load
+
+        async def run():
+            results = await asyncio.gather(*(service.wait_until_ready() for _ in range(3)))
+            results.append(await service.wait_until_ready())
+            return results
+
+        assert asyncio.run(run()) == [False] * 4
+        assert len(calls) == 1
+
+    def test_failed_load_is_retried_in_background(self, monkeypatch):
+        """Test start_loading retries a failed load only once the retry wait has passed"""
+        service = GraphService()
+        calls = []
+
+        async def empty_load():
+            calls.append(1)
+
+        service.load_graph_data = empty_load
+
+        async def run():
+            started = [service.start_loading()]
+            await service._load_task
+            started.append(service.start_loading())
+            monkeypatch.setattr("app.config.settings.GRAPH_LOAD_RETRY_SECONDS", 0)
+            started.append(service.start_loading())
+            await service._load_task
+            return started
+
+        assert asyncio.run(run()) == [True, False, True]
+        assert len(calls) == 2
+
+    def test_reload_keeps_serving_until_swap(self, mock_graph_service, monkeypatch):
+        """Test a reload leaves the loaded graph ready while fetching and after a failed fetch"""
+        import sys
+
+        graph_module = sys.modules["app.services.graph_service"]
+        mock_graph_service._ready.set()
+        seen_ready = []
+
+        class FailingCollection:
+            def find(self):
+                return self
+
+            async def to_list(self, length=None):
+                seen_ready.append(mock_graph_service.is_ready())
+                raise ConnectionError("database went away")
+
+        class FailingDatabase:
+            stops = routes = FailingCollection()
+
+        async def get_failing_database():
+            return FailingDatabase()
+
+        monkeypatch.setattr(graph_module, "get_database", get_failing_database)
+        asyncio.run(mock_graph_service.load_graph_data())
+
+        assert seen_ready == [True, True]
+        assert mock_graph_service.is_ready()
+        assert list(mock_graph_service.stops_cache) == ["S1", "S2", "S3", "S4"]
+
+    def test_algorithm_steps_follow_search(self, mock_graph_service):
+        """Test visualization steps come from the same search as routing"""
+        steps = asyncio.run(mock_graph_service.get_algorithm_execution_steps("S1", "S4", "time"))
+
+        assert steps[0]["action"] == "initialize"
+        assert steps[-1]["action"] == "found_destination"
+        assert steps[-1]["final_path"] == ["S1", "S3", "S4"]
+        assert steps[-1]["total_cost"] == 23
+        assert [s["step"] for s in steps] == list(range(len(steps)))
+
+        steps = asyncio.run(mock_graph_service.get_algorithm_execution_steps("S4", "S1", "time"))
+        assert steps[-1]["action"] == "no_route_found"
+
+    def test_graph_payloads(self, mock_graph_service):
+        """Test pre-serialized node and edge payloads"""
+        import json
+
+        nodes = json.loads(mock_graph_service.get_nodes_payload())["nodes"]
+        edges = json.loads(mock_graph_service.get_edges_payload())["edges"]
+
+        assert len(nodes) == 4
+        assert len(edges) == 5
+        assert {"from": "S1", "to": "S2"}.items() <= edges[0].items()
+
+        # Payloads are dropped when the graph is rebuilt
+        mock_graph_service._invalidate_derived_caches()
+        assert mock_graph_service._nodes_payload is None
+        assert mock_graph_service._edges_payload is None
+
+    def test_graph_etag(self, mock_graph_service):
+        """Test ETag is stable within a graph load and dropped on reload"""
+        etag = mock_graph_service.get_etag()
+
+        assert etag.startswith('W/"')
+        assert mock_graph_service.get_etag() == etag
+
+        mock_graph_service._invalidate_derived_caches()
+        assert mock_graph_service._etag is None
+
+    def test_graph_stats(self, mock_graph_service):
+        """Test cached network statistics"""
+        stats = mock_graph_service.get_stats_payload()["network_stats"]
+
+        assert stats["total_nodes"] == 4
+        assert stats["total_edges"] == 5
+        assert stats["max_connections_per_stop"] == 2
+        assert stats["avg_connections_per_stop"] == 1.25
+        assert stats["route_type_distribution"] == {"bus": 3}